@@ -0,0 +1,89 @@
+"""
+JSON-lines access log for server.py --access-log.
+
+SimpleHTTPRequestHandler writes a formatted line to stderr during every
+request. Here request handlers only put a small dict on a bounded queue,
+which never blocks, and one background thread writes the records in
+batches. If the writer falls behind and the queue fills up, new records
+are dropped and counted instead of slowing requests down. The file is
+rotated by size (access.log -> access.log.1 -> ...).
+"""
+
+import json
+import os
+import queue
+import threading
+
+# Marks the end of the queue on close()
+_STOP = object()
+
+
+class AccessLog:
+    """Structured access log written by a background thread from a bounded queue."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3, queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self.stats = {'written': 0, 'dropped': 0, 'rotations': 0}
+        self._drop_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='access-log', daemon=True)
+        self._thread.start()
+
+    def log(self, record):
+        """Queue a record (dict) for writing. Never blocks; counts a drop if the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.stats['dropped'] += 1
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever else is already waiting so it goes out in one write
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                try:
+                    self._write(records)
+                except OSError as e:
+                    print(f"⚠️  Could not write access log: {e}")
+            if stop:
+                return
+
+    def _write(self, records):
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        self.stats['written'] += len(records)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+        self.stats['rotations'] += 1
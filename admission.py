@@ -0,0 +1,122 @@
+"""
+Admission control for server.py's threaded engine.
+
+Every connection the threaded server accepts gets a thread, and without
+a limit a classroom-sized burst (or a few stalled Wi-Fi clients) can
+pile up hundreds of them. Here at most max_active connections are
+handled at once. Up to max_queued more wait in a FIFO queue and are
+picked up by the next thread that finishes a connection. When the
+queue is full, new connections are shed: the server answers 503 with
+Retry-After without giving them a thread, which costs almost nothing.
+"""
+
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+# Seconds between "busy" lines in the server output while connections are queued or shed
+REPORT_INTERVAL = 5
+
+
+class AdmissionQueue:
+    """Limits connections handled at once; queues a bounded number more and sheds the rest."""
+
+    def __init__(self, max_active, max_queued):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.active = 0
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self.stats = {'admitted': 0, 'queued': 0, 'shed': 0, 'peak_depth': 0}
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    def admit(self, item):
+        """'run' if item can be handled now, 'queued' if it was queued, 'shed' if the queue is full."""
+        with self._lock:
+            if self.active < self.max_active:
+                self.active += 1
+                self.stats['admitted'] += 1
+                return 'run'
+            if len(self._queue) < self.max_queued:
+                self._queue.append(item)
+                self.stats['queued'] += 1
+                self.stats['peak_depth'] = max(self.stats['peak_depth'], len(self._queue))
+                return 'queued'
+            self.stats['shed'] += 1
+            return 'shed'
+
+    def release(self):
+        """Called when a connection is done: the next queued item (which takes over its slot), or None."""
+        with self._lock:
+            if self._queue:
+                self.stats['admitted'] += 1
+                return self._queue.popleft()
+            self.active -= 1
+            return None
+
+    def report(self, write=print, interval=REPORT_INTERVAL):
+        """Write a line every interval seconds while connections are queued or being shed (runs forever)."""
+        last_shed = 0
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                active, depth, shed = self.active, len(self._queue), self.stats['shed']
+                peak = self.stats['peak_depth']
+            if depth or shed != last_shed:
+                write(f"🚦 Busy: {active} connections active, {depth} queued (peak {peak}), "
+                      f"{shed - last_shed} shed with 503 ({shed} in total)")
+                last_shed = shed
+
+
+class Shedder:
+    """Answers shed connections with a canned response, then closes them from one background thread."""
+
+    def __init__(self, response, linger=2.0):
+        self.response = response
+        self.linger = linger
+        self._pending = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='shedder', daemon=True)
+        self._thread.start()
+
+    def shed(self, sock):
+        """Send the response without blocking. Closing is left to the background thread."""
+        try:
+            sock.setblocking(False)
+            sock.send(self.response)
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            sock.close()
+            return
+        self._pending.put(sock)
+
+    def _run(self):
+        # Closing a socket with an unread request in it resets the connection, which can destroy the
+        # 503 before the client reads it. So read until the client closes, or for at most linger seconds.
+        selector = selectors.DefaultSelector()
+        deadlines = {}
+        while True:
+            try:
+                sock = self._pending.get(timeout=0.05 if deadlines else None)
+                selector.register(sock, selectors.EVENT_READ)
+                deadlines[sock] = time.monotonic() + self.linger
+            except queue.Empty:
+                pass
+            for key, _ in selector.select(timeout=0):
+                try:
+                    data = key.fileobj.recv(65536)
+                except OSError:
+                    data = b''
+                if not data:
+                    deadlines[key.fileobj] = 0
+            now = time.monotonic()
+            for sock, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    selector.unregister(sock)
+                    sock.close()
+                    del deadlines[sock]
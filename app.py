@@ -0,0 +1,677 @@
+"""
+The learn-html-css site as an importable WSGI application.
+
+Everything the site does lives here: the app shell and static files
+with their CORS and caching headers, preload links, fingerprinted
+assets, and the optional APIs (progress, short links, the classroom
+dashboard, ZIP export, metrics, client timings, profiling). server.py
+is a command line wrapper that adds its own connection handling
+(keep-alive, admission control, worker processes, reloads) and hands
+each API request to App.handle(). Any WSGI server can serve the same
+application instead:
+
+    gunicorn --workers 4 --threads 8 'app:create_app()'
+
+create_app() without a config reads one from APP_* environment
+variables (see AppConfig.from_env), for example
+APP_PROGRESS_DB=progress.db APP_METRICS=1. Stores and background
+threads are created by create_app(), so let the server create the app
+in each worker (no --preload). The classroom dashboard keeps the class
+in memory and needs a single worker process.
+"""
+
+import dataclasses
+import html
+import http
+import http.server
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+import types
+import urllib.parse
+import wsgiref.util
+from typing import Optional
+
+from access_log import AccessLog
+from byte_ranges import RangeReader, file_response
+from client_timings import ClientTimings, validate_timings
+from classroom import ClassroomBroadcaster, validate_beacon
+from embed_translations import (ASSETS_DIR, FINGERPRINTED_PAGE, LESSON_VALIDATORS, build_fingerprinted_assets,
+                                build_precache_manifest, build_standalone, build_translation_table)
+from live_reload import DEV_PAGE, FileWatcher, LiveReload, build_dev_page
+from metrics import Metrics
+from profiler import RequestProfiler
+from progress_store import ProgressStore, validate_progress
+from project_export import (export_filename, iter_zip, lesson_files, load_export_sources,
+                            state_from_hash, state_from_progress, validate_export_state)
+from shortlinks import ShortLinkStore
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Largest JSON body accepted by the API (student code is small)
+MAX_BODY_BYTES = 1024 * 1024
+
+STUDENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Metric labels for routes with ids in them, so each student or link does not get its own series
+ROUTE_LABELS = [
+    (re.compile(r'^/api/classroom/events$'), '/api/classroom/events'),
+    (re.compile(r'^/api/dev/events$'), '/api/dev/events'),
+    (re.compile(r'^/api/(progress|short-links|classroom|export|timings|profile)$'), None),  # label is the path itself
+    (re.compile(r'^/api/progress/[^/]+$'), '/api/progress/:id'),
+    (re.compile(r'^/api/classroom/[^/]+$'), '/api/classroom/:id'),
+    (re.compile(r'^/api/export/[^/]+$'), '/api/export/:id'),
+    (re.compile(r'^/s/[^/]+$'), '/s/:id'),
+]
+
+# Headers added to every response (CORS for development, and no caching so edits show up on reload)
+RESPONSE_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST'),
+    ('Cache-Control', 'no-store, no-cache, must-revalidate'),
+]
+
+# In dev mode browsers revalidate instead (ETag, 304), so a reload only downloads what changed
+DEV_RESPONSE_HEADERS = [
+    *((name, value) for name, value in RESPONSE_HEADERS if name != 'Cache-Control'),
+    ('Cache-Control', 'no-cache'),
+]
+
+# Fingerprinted copies (assets/styles.<hash>.css) never change, since an edit gets a new name
+IMMUTABLE_RESPONSE_HEADERS = [
+    *((name, value) for name, value in RESPONSE_HEADERS if name != 'Cache-Control'),
+    ('Cache-Control', 'public, max-age=31536000, immutable'),
+]
+
+# Streams that stay open as long as the page does. They are never profiled: only one request is
+# profiled at a time, so a sampled stream would leave every other request unprofiled until it closed
+EVENT_STREAM_ROUTES = ('/api/classroom/events', '/api/dev/events')
+
+# Pages answered with Link: rel=preload headers for the files they load at startup
+APP_PAGES = ('/', '/index.html')
+
+# Files watched in dev mode; a change reruns the build steps and reloads open pages
+DEV_SOURCE_FILES = ['index.html', 'styles.css', 'translations.json', LESSON_VALIDATORS]
+
+# Environment values that turn a flag on in AppConfig.from_env
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+@dataclasses.dataclass
+class AppConfig:
+    """Which optional features are enabled and where their data is kept. Relative paths are from the working directory."""
+
+    directory: str = PROJECT_DIR  # the files served: index.html, styles.css, translations.json, ...
+    progress_db: Optional[str] = None  # /api/progress, saving progress to this SQLite database
+    short_links: Optional[str] = None  # /s/<id> short links, stored in this SQLite database
+    classroom: bool = False  # live classroom dashboard (dashboard.html); one process only
+    zip_export: bool = False  # "Download all my files" ZIP built on the server (/api/export)
+    metrics: bool = False  # /metrics and browser startup timings (/api/timings)
+    access_log: Optional[str] = None  # JSON-lines access log written from a background thread
+    profile: Optional[float] = None  # fraction of requests (0-1) run under cProfile
+    profile_dir: str = 'profiles'
+    fingerprint: bool = False  # serve index.html referring to content-hashed copies of its files
+    dev: bool = False  # rebuild and reload open pages when a source file changes; one process only
+    worker: Optional[int] = None  # index of this process among several: names its access log and profile dir
+
+    @classmethod
+    def from_env(cls, environ=None, prefix='APP_'):
+        """Config from environment variables named after the fields: APP_PROGRESS_DB, APP_METRICS=1 and so on."""
+        environ = os.environ if environ is None else environ
+        converters = {bool: lambda value: value.lower() in TRUE_VALUES, Optional[float]: float, Optional[int]: int}
+        values = {}
+        for field in dataclasses.fields(cls):
+            value = environ.get(prefix + field.name.upper())
+            if value is not None:
+                values[field.name] = converters.get(field.type, str)(value)
+        return cls(**values)
+
+
+def prepare_site(config, changed=None):
+    """
+    The build step, run once before serving (server.py runs it before
+    forking workers, so they share the result): rebuild the translation
+    table, the fingerprinted copies and the precache manifest so they match
+    the files being served, and load the export sources. In dev mode it runs
+    again when source files change, with their names in `changed`, and the
+    translation table is only rebuilt if translations.json is one of them
+    (fingerprinted copies are only written for new content anyway). Dev mode
+    also rebuilds index-standalone.html, so it never lags behind the lessons.
+    """
+    # Explicit paths, not os.chdir: in dev mode this runs on the watcher thread while requests are served
+    directory = config.directory
+    if changed is None or 'translations.json' in changed:
+        build_translation_table(directory=directory)
+    assets = build_fingerprinted_assets(directory=directory) if config.fingerprint else None
+    page = FINGERPRINTED_PAGE if assets else 'index.html'
+    if config.dev:
+        build_standalone(directory=directory)
+        build_dev_page(os.path.join(directory, page), os.path.join(directory, DEV_PAGE))
+        page = DEV_PAGE
+    precache_manifest = build_precache_manifest(assets=assets, directory=directory)
+    export_sources = load_export_sources(os.path.join(directory, 'translations.json'),
+                                         os.path.join(directory, LESSON_VALIDATORS)) if config.zip_export else None
+    return {'assets': assets, 'page': page, 'precache_manifest': precache_manifest, 'export_sources': export_sources}
+
+
+def create_app(config=None, site=None):
+    """The WSGI application. config defaults to AppConfig.from_env(); site to prepare_site(config)."""
+    return App(config if config is not None else AppConfig.from_env(), site)
+
+
+def is_dynamic(path):
+    """Requests the application answers itself rather than serving a file."""
+    return path.startswith(('/api/', '/s/')) or path.split('?', 1)[0] == '/metrics'
+
+
+def preload_link(resource):
+    """Link header entry preloading one resource from the precache manifest's preload list."""
+    url = resource['url'] if '://' in resource['url'] else '/' + resource['url']
+    link = f"<{url}>; rel=preload; as={resource['as']}"
+    return link + '; crossorigin' if resource['crossorigin'] else link
+
+
+def json_response(status, payload):
+    return status, [('Content-Type', 'application/json')], json.dumps(payload).encode('utf-8')
+
+
+def error_response(status, message):
+    """The same HTML error page as http.server's send_error."""
+    body = http.server.DEFAULT_ERROR_MESSAGE % {
+        'code': status,
+        'message': html.escape(message, quote=False),
+        'explain': html.escape(http.HTTPStatus(status).description, quote=False),
+    }
+    return status, [('Content-Type', http.server.DEFAULT_ERROR_CONTENT_TYPE)], body.encode('utf-8', 'replace')
+
+
+class Request:
+    """The parts of a WSGI environ the routes use."""
+
+    def __init__(self, environ):
+        self.environ = environ
+        self.method = environ['REQUEST_METHOD']
+        self.path = environ.get('PATH_INFO') or '/'
+        self.query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+        self.content_type = environ.get('CONTENT_TYPE', '')
+
+    def read_body(self):
+        length = self.environ.get('CONTENT_LENGTH') or '0'
+        if not length.isdigit() or int(length) > MAX_BODY_BYTES:
+            raise ValueError('request body too large' if length.isdigit() else 'invalid Content-Length')
+        return self.environ['wsgi.input'].read(int(length))
+
+    def read_json(self):
+        return json.loads(self.read_body() or b'null')
+
+
+class RecordedBody:
+    """Response body that counts the bytes sent and calls on_close(size) when the server closes it."""
+
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close(self.size)
+
+
+class App:
+    """The site as a WSGI application. Use create_app() to make one."""
+
+    def __init__(self, config, site=None):
+        self.config = config
+        site = site if site is not None else prepare_site(config)
+        self.directory = os.path.abspath(config.directory)
+        self.use_site(site)
+        # Served for / and /index.html: with fingerprinting the copy that refers to the fingerprinted files,
+        # in dev mode the copy with the live reload script
+        self.page = os.path.join(self.directory, site['page'])
+        self.common_headers = DEV_RESPONSE_HEADERS if config.dev else RESPONSE_HEADERS
+        # translate_path only needs .directory, so http.server's URL -> file mapping is reused as is
+        self._paths = types.SimpleNamespace(directory=self.directory)
+        # Set when the server stops or hands over to a new one (reload): event streams end
+        self.draining = threading.Event()
+
+        # Optional progress persistence
+        self.progress_store = ProgressStore(config.progress_db) if config.progress_db else None
+
+        # Optional short links for progress and certificate URLs
+        self.short_links = ShortLinkStore(config.short_links) if config.short_links else None
+
+        # Optional live classroom dashboard
+        self.classroom = ClassroomBroadcaster() if config.classroom else None
+
+        self.export_stats = {'compressed': 0, 'uncompressed': 0}
+        self._export_stats_lock = threading.Lock()
+
+        # Optional request metrics, with startup timings reported by the app
+        self.metrics = Metrics() if config.metrics else None
+        self.client_timings = ClientTimings() if config.metrics else None
+
+        # Optional sampling profiler; dump with GET /api/profile
+        self.profiler = None
+        if config.profile:
+            profile_dir = config.profile_dir
+            if config.worker is not None:
+                profile_dir = os.path.join(profile_dir, f'worker{config.worker}')
+            self.profiler = RequestProfiler(config.profile, profile_dir)
+
+        # Optional structured access log; one file per worker, since each rotates its own
+        self.access_log = None
+        if config.access_log:
+            root, extension = os.path.splitext(config.access_log)
+            path = config.access_log if config.worker is None else f'{root}-worker{config.worker}{extension}'
+            self.access_log = AccessLog(path)
+
+        # Optional live reload: rebuild when a source file changes and tell open pages to reload
+        self.live_reload = self.watcher = None
+        if config.dev:
+            self.live_reload = LiveReload(site['precache_manifest']['version'])
+            self.watcher = FileWatcher([os.path.join(self.directory, name) for name in DEV_SOURCE_FILES], self.rebuild)
+
+        if self.metrics is not None:
+            self._add_collectors()
+
+    def use_site(self, site):
+        self.assets = site['assets']
+        self.export_sources = site['export_sources']
+        self.preload_link = ', '.join(preload_link(resource)
+                                      for resource in site['precache_manifest'].get('preload', []))
+
+    def early_hints(self, path):
+        """Link header value for a 103 Early Hints before the page at a URL path (from the latest build), or None."""
+        if path in APP_PAGES and self.preload_link:
+            return self.preload_link
+        return None
+
+    def rebuild(self, changed):
+        """Rerun the build for changed source files (dev mode) and publish the new version to open pages."""
+        names = sorted(os.path.basename(path) for path in changed)
+        site = prepare_site(self.config, names)
+        self.use_site(site)
+        print(f"🔃 Rebuilt after changes to {', '.join(names)} (open pages: {self.live_reload.clients})")
+        self.live_reload.publish(site['precache_manifest']['version'])
+
+    def _add_collectors(self):
+        metrics = self.metrics
+        metrics.add_collector(self.client_timings.collect)
+        if self.short_links is not None:
+            metrics.add_collector(lambda: [
+                ('shortlink_cache_hits_total', (), self.short_links.cache.hits),
+                ('shortlink_cache_misses_total', (), self.short_links.cache.misses),
+            ])
+        if self.progress_store is not None:
+            metrics.add_collector(lambda: [
+                ('progress_saves_total', (), self.progress_store.stats['saves']),
+                ('progress_saves_coalesced_total', (), self.progress_store.stats['coalesced']),
+                ('progress_rows_written_total', (), self.progress_store.stats['rows_written']),
+            ])
+        if self.classroom is not None:
+            metrics.add_collector(lambda: [
+                ('classroom_clients', (), self.classroom.clients),
+                ('classroom_broadcast_latency_seconds', (), self.classroom.stats['last_latency_ms'] / 1000),
+            ])
+        if self.access_log is not None:
+            metrics.add_collector(lambda: [
+                ('access_log_written_total', (), self.access_log.stats['written']),
+                ('access_log_dropped_total', (), self.access_log.stats['dropped']),
+            ])
+        if self.export_sources is not None:
+            def export_metrics():
+                with self._export_stats_lock:
+                    compressed, uncompressed = self.export_stats['compressed'], self.export_stats['uncompressed']
+                return [
+                    ('export_compressed_bytes_total', (), compressed),
+                    ('export_uncompressed_bytes_total', (), uncompressed),
+                    ('export_compression_ratio', (), compressed / uncompressed if uncompressed else 0.0),
+                ]
+            metrics.add_collector(export_metrics)
+
+    def close(self):
+        """Flush and close the stores and the access log."""
+        self.draining.set()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.progress_store is not None:
+            self.progress_store.close()
+        if self.short_links is not None:
+            self.short_links.close()
+        if self.classroom is not None:
+            self.classroom.close()
+        if self.access_log is not None:
+            self.access_log.close()
+
+    # Files, headers and request accounting, shared with server.py's handler
+
+    def translate_path(self, path):
+        """Filesystem path for a URL path (/ and /index.html are the page, see self.page)."""
+        if urllib.parse.urlsplit(path).path in APP_PAGES:
+            return self.page
+        return http.server.SimpleHTTPRequestHandler.translate_path(self._paths, path)
+
+    def response_headers(self, path, status):
+        """Headers added to every response: RESPONSE_HEADERS (long-term caching for a fingerprinted file) and preloads."""
+        path = urllib.parse.urlsplit(path or '').path
+        if status in (200, 206) and path.startswith(f'/{ASSETS_DIR}/'):
+            return IMMUTABLE_RESPONSE_HEADERS
+        if status == 200 and path in APP_PAGES and self.preload_link:
+            return self.common_headers + [('Link', self.preload_link)]
+        return self.common_headers
+
+    def start_profile(self, path):
+        """Start profiling a request if the profiler samples it (never an event stream). Returns the profile or None."""
+        if self.profiler is None or urllib.parse.urlsplit(path).path in EVENT_STREAM_ROUTES:
+            return None
+        return self.profiler.start()
+
+    def route_label(self, path):
+        """Metric label for a request path: id routes grouped, files by path, anything else 'other'."""
+        path = urllib.parse.urlsplit(path or '').path
+        for pattern, label in ROUTE_LABELS:
+            if pattern.match(path):
+                return label or path
+        if path in ('/', '/metrics') or os.path.isfile(self.translate_path(path)):
+            return path
+        return 'other'
+
+    def record_request(self, route, method, status, size, duration, client, path, user_agent):
+        """Count a finished request in /metrics and the access log (whichever are enabled)."""
+        if self.metrics is not None:
+            self.metrics.inc('http_requests_total', (('route', route), ('method', method or ''), ('status', str(status))))
+            self.metrics.observe('http_request_duration_seconds', (('route', route),), duration)
+            self.metrics.inc('http_response_bytes_total', (('route', route),), size)
+        if self.access_log is not None:
+            self.access_log.log({
+                'time': time.time(),
+                'client': client,
+                'method': method,
+                'path': path,
+                'status': status,
+                'bytes': size,
+                'duration_ms': round(duration * 1000, 3),
+                'user_agent': user_agent,
+            })
+
+    # WSGI
+
+    def __call__(self, environ, start_response):
+        """WSGI entry point: handle() plus the common headers, metrics, access log and profiling."""
+        start = time.perf_counter()
+        profile = self.start_profile(environ.get('PATH_INFO') or '/')
+        try:
+            status, headers, body = self.handle(environ)
+        except BaseException:
+            if profile is not None:
+                self.profiler.finish(profile, None)
+            raise
+        path = environ.get('PATH_INFO') or '/'
+        start_response(f'{status} {http.HTTPStatus(status).phrase}',
+                       headers + self.response_headers(path, status))
+        if isinstance(body, bytes):
+            body = [body]
+        if self.metrics is None and self.access_log is None and profile is None:
+            return body
+
+        def finished(size):
+            route = self.route_label(path)
+            if profile is not None:
+                self.profiler.finish(profile, route)
+            query = environ.get('QUERY_STRING')
+            self.record_request(route, environ['REQUEST_METHOD'], status, size, time.perf_counter() - start,
+                                environ.get('REMOTE_ADDR'), path + ('?' + query if query else ''),
+                                environ.get('HTTP_USER_AGENT'))
+
+        # Counting the bytes means file bodies are copied by the server instead of sent with its file_wrapper
+        return RecordedBody(body, finished)
+
+    def handle(self, environ):
+        """
+        Answer one request without the common headers: (status, headers,
+        body), where body is bytes or an iterable of bytes. A response
+        without Content-Length (event stream, ZIP export) ends when the
+        connection closes.
+        """
+        request = Request(environ)
+        method, path = request.method, request.path
+        if method in ('GET', 'POST') and path.startswith('/api/'):
+            status, headers, body = self.handle_api(request)
+        elif method == 'GET' and path == '/metrics' and self.metrics is not None:
+            status, headers, body = self.send_metrics()
+        elif method == 'GET' and path.startswith('/s/') and self.short_links is not None:
+            status, headers, body = self.short_link_redirect(path)
+        elif method in ('GET', 'HEAD'):
+            status, headers, body = self.static_file(request)
+        elif method == 'POST':
+            status, headers, body = error_response(404, 'Not found')
+        else:
+            status, headers, body = error_response(501, f'Unsupported method ({method!r})')
+        if isinstance(body, bytes) and status not in (204, 304) and \
+                not any(name.lower() == 'content-length' for name, _ in headers):
+            headers = headers + [('Content-Length', str(len(body)))]
+        return status, headers, body
+
+    def static_file(self, request):
+        """A file from the served directory (index.html for a directory), like http.server without listings; Range requests get 206."""
+        path = self.translate_path(request.path)
+        if os.path.isdir(path):
+            if not request.path.endswith('/'):
+                query = request.environ.get('QUERY_STRING')
+                location = request.path + '/' + ('?' + query if query else '')
+                return 301, [('Location', location)], b''
+            path = os.path.join(path, 'index.html')
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return error_response(404, 'File not found')
+        environ = request.environ
+        status, headers, segments = file_response(request.method, os.fstat(f.fileno()), self.guess_type(path),
+                                                  environ.get('HTTP_IF_NONE_MATCH'), environ.get('HTTP_RANGE'),
+                                                  environ.get('HTTP_IF_RANGE'))
+        if status == 206:
+            # Not the server's file_wrapper: it may sendfile the whole file
+            return 206, headers, wsgiref.util.FileWrapper(RangeReader(f, segments), 64 * 1024)
+        if not segments:
+            f.close()
+            return status, headers, b''
+        file_wrapper = environ.get('wsgi.file_wrapper', wsgiref.util.FileWrapper)
+        return 200, headers, file_wrapper(f, 64 * 1024)
+
+    @staticmethod
+    def guess_type(path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in http.server.SimpleHTTPRequestHandler.extensions_map:
+            return http.server.SimpleHTTPRequestHandler.extensions_map[extension]
+        return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    # Routes
+
+    def send_metrics(self):
+        body = self.metrics.render().encode('utf-8')
+        return 200, [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')], body
+
+    def handle_api(self, request):
+        parts = request.path.rstrip('/').split('/')[2:]  # ['progress', '<student id>']
+        if parts[:1] == ['progress'] and self.progress_store is not None:
+            return self.handle_progress(request, parts[1:])
+        if parts == ['short-links'] and self.short_links is not None:
+            return self.handle_short_link_create(request)
+        if parts[:1] == ['classroom'] and self.classroom is not None:
+            return self.handle_classroom(request, parts[1:])
+        if parts[:1] == ['export'] and self.export_sources is not None:
+            return self.handle_export(request, parts[1:])
+        if parts == ['timings'] and self.client_timings is not None:
+            return self.handle_timings(request)
+        if parts == ['profile'] and self.profiler is not None and request.method == 'GET':
+            return self.send_profile(request)
+        if parts == ['dev', 'events'] and self.live_reload is not None and request.method == 'GET':
+            return 200, [('Content-Type', 'text/event-stream')], self.dev_events()
+        return error_response(404, 'Not found')
+
+    def handle_progress(self, request, parts):
+        # GET /api/progress lets the app check whether saving is enabled
+        if not parts:
+            if request.method == 'GET':
+                return json_response(200, {'enabled': True})
+            return error_response(405, 'Method not allowed')
+        student_id = parts[0]
+        if len(parts) > 1 or not STUDENT_ID_PATTERN.match(student_id):
+            return error_response(404, 'Not found')
+
+        if request.method == 'GET':
+            progress = self.progress_store.load(student_id)
+            if progress is None:
+                return json_response(404, {'error': 'no saved progress'})
+            return json_response(200, progress)
+
+        try:
+            progress = validate_progress(request.read_json())
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        self.progress_store.save(student_id, progress)
+        return json_response(202, {'saved': True})
+
+    def handle_short_link_create(self, request):
+        # GET /api/short-links lets the app check whether short links are enabled
+        if request.method == 'GET':
+            return json_response(200, {'enabled': True})
+        try:
+            payload = request.read_json()
+            short_id = self.short_links.create(payload.get('hash') if isinstance(payload, dict) else None)
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        return json_response(201, {'id': short_id, 'path': f'/s/{short_id}'})
+
+    def short_link_redirect(self, path):
+        short_id = path[len('/s/'):].rstrip('/')
+        state = self.short_links.resolve(short_id)
+        if state is None:
+            return error_response(404, 'Unknown short link')
+        return 302, [('Location', f'/#{state}')], b''
+
+    def handle_classroom(self, request, parts):
+        # GET /api/classroom lets the app check whether the dashboard is enabled
+        if not parts:
+            if request.method == 'GET':
+                return json_response(200, dict(self.classroom.stats, enabled=True, clients=self.classroom.clients))
+            return error_response(405, 'Method not allowed')
+        if parts == ['events'] and request.method == 'GET':
+            return 200, [('Content-Type', 'text/event-stream')], self.classroom_events()
+        student_id = parts[0]
+        if len(parts) > 1 or request.method != 'POST' or not STUDENT_ID_PATTERN.match(student_id):
+            return error_response(404, 'Not found')
+        try:
+            beacon = validate_beacon(request.read_json())
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        self.classroom.update(student_id, beacon)
+        return 204, [], b''
+
+    def classroom_events(self):
+        # Server-Sent Events: one 'data:' message per class snapshot, until the dashboard disconnects
+        # (the server closes this generator) or the server stops; the dashboard then reconnects
+        subscriber = self.classroom.subscribe()
+        try:
+            yield b'retry: 2000\n\n'
+            while not self.draining.is_set():
+                snapshot = subscriber.next(timeout=SSE_KEEPALIVE_SECONDS)
+                if snapshot is None:
+                    yield b': keep-alive\n\n'
+                else:
+                    yield f'data: {snapshot}\n\n'.encode('utf-8')
+        finally:
+            self.classroom.unsubscribe(subscriber)
+
+    def dev_events(self):
+        # Server-Sent Events: the build version when the page connects and after every rebuild
+        subscriber = self.live_reload.subscribe()
+        try:
+            yield f'retry: 1000\nevent: version\ndata: {self.live_reload.version}\n\n'.encode('utf-8')
+            while not self.draining.is_set():
+                version = subscriber.next(timeout=SSE_KEEPALIVE_SECONDS)
+                if version is None:
+                    yield b': keep-alive\n\n'
+                else:
+                    yield f'event: version\ndata: {version}\n\n'.encode('utf-8')
+        finally:
+            self.live_reload.unsubscribe(subscriber)
+
+    def send_profile(self, request):
+        # GET /api/profile[?top=N]: dump pstats files per route and return the text summary
+        try:
+            top = int(request.query.get('top', [self.profiler.top])[0])
+        except ValueError:
+            top = self.profiler.top
+        files = self.profiler.dump()
+        body = (self.profiler.summary(top) + '\nWritten:\n' + '\n'.join(files) + '\n').encode('utf-8')
+        return 200, [('Content-Type', 'text/plain; charset=utf-8')], body
+
+    def handle_timings(self, request):
+        # GET /api/timings: whether collection is enabled, with percentiles per mark
+        if request.method == 'GET':
+            return json_response(200, {'enabled': True, 'marks': self.client_timings.summary()})
+        try:
+            marks = validate_timings(request.read_json())
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        self.client_timings.record(marks)
+        return 204, [], b''
+
+    def handle_export(self, request, parts):
+        lesson_ids, _ = self.export_sources
+        try:
+            if parts and request.method == 'GET':
+                # GET /api/export/<student id>: progress saved with progress_db
+                progress = None
+                if self.progress_store is not None and len(parts) == 1 and STUDENT_ID_PATTERN.match(parts[0]):
+                    progress = self.progress_store.load(parts[0])
+                if progress is None:
+                    return error_response(404, 'No saved progress')
+                state = state_from_progress(progress, lesson_ids)
+            elif parts:
+                return error_response(404, 'Not found')
+            elif request.method == 'POST':
+                # The app posts a form (so the browser saves the response straight to disk) with
+                # a JSON 'state' field: {name, language, codeByLesson}. A JSON body works too.
+                body = request.read_body()
+                if request.content_type.startswith('application/x-www-form-urlencoded'):
+                    body = urllib.parse.parse_qs(body.decode('utf-8')).get('state', [''])[0]
+                state = validate_export_state(json.loads(body or 'null'))
+            elif 'hash' in request.query:
+                # GET /api/export?hash=<progress URL hash>
+                state = state_from_hash(request.query['hash'][0], lesson_ids)
+            else:
+                # GET /api/export lets the app check whether server-side export is enabled
+                return json_response(200, {'enabled': True})
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+        headers = [
+            ('Content-Type', 'application/zip'),
+            ('Content-Disposition', f'attachment; filename="{export_filename(state["name"])}"'),
+        ]
+        return 200, headers, self.zip_export(state)
+
+    def zip_export(self, state):
+        # No Content-Length: entries are compressed and sent one at a time
+        lesson_ids, translations = self.export_sources
+        sizes = {}
+        yield from iter_zip(lesson_files(state, lesson_ids, translations), sizes)
+        with self._export_stats_lock:
+            self.export_stats['compressed'] += sizes['compressed']
+            self.export_stats['uncompressed'] += sizes['uncompressed']
@@ -0,0 +1,303 @@
+"""
+Asyncio server engine for server.py --engine asyncio.
+
+The default engine gives every connection a thread, and copies each
+file through Python buffers. This engine serves static files from one event loop
+with loop.sendfile (os.sendfile where the platform has it, so file bytes
+go from the page cache to the socket without passing through Python),
+and keeps HTTP/1.1 connections open between requests. An idle
+keep-alive connection is just a suspended coroutine, so thousands of
+them cost very little. A page that `early_hints(path)` returns a Link
+header for is preceded by a 103 Early Hints response, and `aliases`
+serves a different file for a URL path. Range requests get 206 Partial Content (byte_ranges.py), with
+each range sent by sendfile, and If-None-Match gets 304.
+
+Everything else (the /api routes, /s/ short links, /metrics, directory
+redirects, errors) is handed to the same request handler class the
+threaded engine uses. It runs on its own thread, reading the
+already-received request from memory and writing back through the event
+loop. Those connections close after the response, like they do on the
+threaded engine.
+
+stop() ends serve_forever gracefully: the engine stops accepting,
+closes idle keep-alive connections, lets in-flight requests finish, and
+then returns.
+"""
+
+import asyncio
+import concurrent.futures
+import email.utils
+import http
+import http.server
+import io
+import mimetypes
+import os
+import threading
+import time
+import types
+import urllib.parse
+
+from byte_ranges import file_response
+
+# Seconds an idle keep-alive connection is kept open
+KEEPALIVE_TIMEOUT = 120
+
+# Requests served on one connection before it is closed
+MAX_REQUESTS = 100
+
+# Seconds a request body read or a response write may stall before the connection is closed
+IO_TIMEOUT = 30
+
+# Largest request head (request line and headers) accepted
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class _BridgeSocket:
+    """
+    Socket stand-in for running a blocking http.server handler on a thread:
+    the request is read from memory and writes are sent (with flow control)
+    through the event loop.
+    """
+
+    def __init__(self, raw_request, loop, writer):
+        self._raw = raw_request
+        self._loop = loop
+        self._writer = writer
+        self._timeout = None
+
+    def makefile(self, mode, buffering=None):
+        return io.BytesIO(self._raw)
+
+    def sendall(self, data):
+        future = asyncio.run_coroutine_threadsafe(self._send(bytes(data)), self._loop)
+        try:
+            future.result(self._timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError('timed out sending to the client')
+
+    async def _send(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def settimeout(self, timeout):
+        # Only writes can stall: the request has already been read
+        self._timeout = timeout
+
+    def setsockopt(self, *args):
+        pass
+
+
+class AsyncEngine:
+    """Event loop HTTP server: sendfile for static files, keep-alive, other requests bridged to handler_class."""
+
+    def __init__(self, handler_class, directory, response_headers, is_dynamic,
+                 on_request=None, keepalive_timeout=KEEPALIVE_TIMEOUT, max_requests=MAX_REQUESTS,
+                 read_timeout=IO_TIMEOUT, write_timeout=IO_TIMEOUT, max_body_bytes=1024 * 1024,
+                 early_hints=None, aliases=None):
+        self.handler_class = handler_class
+        self.max_body_bytes = max_body_bytes
+        self.directory = directory
+        self.response_headers = response_headers  # (URL path, status) -> headers added to a static file
+        self.is_dynamic = is_dynamic
+        self.on_request = on_request
+        self.keepalive_timeout = keepalive_timeout
+        self.max_requests = max_requests
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.early_hints = early_hints  # (URL path) -> Link header value sent in a 103 first, or None
+        self.aliases = aliases or {}  # URL path -> file served in its place
+        # translate_path only needs .directory, so the handler's own URL -> file mapping is reused as is
+        self._paths = types.SimpleNamespace(directory=directory)
+        self.draining = False
+        self._idle = set()  # writers of connections waiting for their next request
+        self.stats = {
+            'connections': 0,
+            'active_connections': 0,
+            'requests': 0,
+            'keepalive_reuses': 0,
+            'sendfile_bytes': 0,
+            'bridged': 0,
+        }
+
+    def translate_path(self, path):
+        return http.server.SimpleHTTPRequestHandler.translate_path(self._paths, path)
+
+    def guess_type(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in self.handler_class.extensions_map:
+            return self.handler_class.extensions_map[extension]
+        return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    async def serve_forever(self, sock, ready=None, drain_timeout=30):
+        """Serve on a listening socket until stop(). Returns False if requests were still running after drain_timeout."""
+        server = await asyncio.start_server(self._handle_connection, sock=sock, limit=MAX_HEADER_BYTES)
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if ready is not None:
+            ready()
+        await self._stopped.wait()
+        # Stop accepting first: connections already accepted in this loop iteration still need the server
+        # open to set up their transport, and only count as active once their handler starts
+        self._loop.remove_reader(sock.fileno())
+        await asyncio.sleep(0.1)
+        server.close()
+        deadline = time.monotonic() + drain_timeout
+        while self.stats['active_connections']:
+            for writer in list(self._idle):
+                writer.close()
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def stop(self):
+        """Stop accepting connections and let serve_forever drain and return. Safe to call from any thread."""
+        self.draining = True
+        self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        self.stats['active_connections'] += 1
+        client = writer.get_extra_info('peername') or ('', 0)
+        try:
+            served = 0
+            while True:
+                if served:
+                    self._idle.add(writer)  # closed by a drain; a new connection still gets its first request answered
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                finally:
+                    self._idle.discard(writer)
+                if served:
+                    self.stats['keepalive_reuses'] += 1
+                served += 1
+                self.stats['requests'] += 1
+                method, target, version, headers = self._parse_head(head)
+                file_path = self._static_file(method, target, headers)
+                if file_path is None:
+                    await self._bridge(head, reader, writer, client, headers)
+                    break
+                keep_alive = self._keep_alive(version, headers) and served < self.max_requests and not self.draining
+                if not await self._send_file(writer, method, target, version, file_path, keep_alive, client, headers):
+                    break
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.stats['active_connections'] -= 1
+            writer.close()
+
+    @staticmethod
+    def _parse_head(head):
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        # Anything but 'METHOD target HTTP/x.y' is bridged, and the handler answers 400
+        method, target, version = parts if len(parts) == 3 else ('', '', '')
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
+
+    @staticmethod
+    def _keep_alive(version, headers):
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+    def _static_file(self, method, target, headers):
+        """Filesystem path when the request is a plain GET/HEAD of a file, else None (bridged)."""
+        if method not in ('GET', 'HEAD') or headers.get('content-length', '0') != '0':
+            return None
+        if not target.startswith('/') or self.is_dynamic(target):
+            return None
+        alias = self.aliases.get(urllib.parse.urlsplit(target).path)
+        if alias is not None:
+            return alias
+        path = self.translate_path(target)
+        if os.path.isdir(path):
+            # Directory redirects are left to the handler
+            if not urllib.parse.urlsplit(target).path.endswith('/'):
+                return None
+            path = os.path.join(path, 'index.html')
+        return path if os.path.isfile(path) else None
+
+    async def _send_file(self, writer, method, target, version, path, keep_alive, client, headers):
+        """Send a file with sendfile. Returns False if the connection broke."""
+        start = time.perf_counter()
+        link = self.early_hints and self.early_hints(urllib.parse.urlsplit(target).path)
+        if link and method == 'GET' and version == 'HTTP/1.1':
+            writer.write(f'HTTP/1.1 103 Early Hints\r\nLink: {link}\r\n\r\n'.encode('latin-1'))
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False
+        with f:
+            status, response_headers, segments = file_response(method, os.fstat(f.fileno()), self.guess_type(path),
+                                                               headers.get('if-none-match'), headers.get('range'),
+                                                               headers.get('if-range'))
+            response = [
+                f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}',
+                f'Server: {http.server.SimpleHTTPRequestHandler.server_version}',
+                f'Date: {email.utils.formatdate(usegmt=True)}',
+                *(f'{name}: {value}' for name, value in response_headers),
+            ]
+            response += [f'{name}: {value}' for name, value in self.response_headers(target, status)]
+            response.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+            head = ('\r\n'.join(response) + '\r\n\r\n').encode('latin-1')
+            try:
+                writer.write(head)
+                sent = 0
+                for segment in segments:
+                    if isinstance(segment, bytes):
+                        writer.write(segment)
+                        sent += len(segment)
+                        continue
+                    offset, count = segment
+                    count = await asyncio.wait_for(asyncio.get_running_loop().sendfile(writer.transport, f, offset, count),
+                                                   self.write_timeout)
+                    self.stats['sendfile_bytes'] += count
+                    sent += count
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+            except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+                return False
+        if self.on_request is not None:
+            self.on_request(method, target, status, len(head) + sent, time.perf_counter() - start,
+                            client[0], headers.get('user-agent'))
+        return True
+
+    async def _bridge(self, head, reader, writer, client, headers):
+        """Run the handler class for this request on its own thread."""
+        self.stats['bridged'] += 1
+        body = b''
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = 0
+        if 0 < length <= self.max_body_bytes:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        bridge = _BridgeSocket(head + body, loop, writer)
+
+        def run():
+            try:
+                self.handler_class(bridge, client, None)
+            except Exception as e:  # client went away mid-response, or a handler bug
+                if not isinstance(e, ConnectionError):
+                    print(f"⚠️  Error handling {client[0]}: {e!r}")
+            finally:
+                loop.call_soon_threadsafe(done.set_result, None)
+
+        # A thread per bridged request (not a pool): event streams stay open indefinitely
+        threading.Thread(target=run, name='bridged-request', daemon=True).start()
+        await done
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the "Download all my files" export: streamed from the server
+(project_export.write_zip, as used by server.py --zip-export) versus built
+whole in memory, which is what the browser does with JSZip's
+generateAsync({type: 'blob'}).
+
+Usage:
+    python3 benchmark_export.py [--code-kb N] [--runs N] [--url http://localhost:8000]
+
+Reports, for each path: time to the first byte of the archive, total time,
+archive size and peak memory (tracemalloc). With --url, also times the
+real /api/export endpoint of a running server (started with --zip-export).
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+
+from project_export import lesson_files, load_export_sources, write_zip
+
+JSZIP_URL = 'https://unpkg.com/jszip@3.10.1/dist/jszip.min.js'
+
+
+class NullSink:
+    """Stands in for the socket: records when the first byte arrives and how many bytes were sent."""
+
+    def __init__(self, start):
+        self.start = start
+        self.first_byte = None
+        self.size = 0
+
+    def write(self, data):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter() - self.start
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def make_state(lesson_ids, code_kb):
+    """A student who wrote code_kb KB of HTML in every lesson."""
+    paragraph = '<p>Practice makes perfect. Accessible pages work for everyone.</p>\n'
+    code = paragraph * max(1, code_kb * 1024 // len(paragraph))
+    return {'name': 'Benchmark Student', 'language': 'en',
+            'codeByLesson': {lesson_id: f'<h1>{lesson_id}</h1>\n{code}' for lesson_id in lesson_ids}}
+
+
+def measure(build, runs):
+    """Median (first byte, total, size) over runs, and peak memory of one extra traced run."""
+    first_bytes, totals = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        first_byte, size = build(start)
+        totals.append(time.perf_counter() - start)
+        first_bytes.append(first_byte)
+    tracemalloc.start()
+    build(time.perf_counter())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(first_bytes), statistics.median(totals), size, peak
+
+
+def print_row(label, first_byte, total, size, peak):
+    print(f"{label:<28} {first_byte * 1000:>10.1f} {total * 1000:>10.1f} {size / 1024:>10.0f} {peak / 1024:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streamed versus in-memory ZIP export.')
+    parser.add_argument('--code-kb', type=int, default=20, help='KB of code per lesson (default: 20)')
+    parser.add_argument('--runs', type=int, default=20, help='runs per path (default: 20)')
+    parser.add_argument('--url', help='also time /api/export on a server running with --zip-export')
+    args = parser.parse_args()
+
+    lesson_ids, translations = load_export_sources()
+    state = make_state(lesson_ids, args.code_kb)
+
+    def streamed(start):
+        sink = NullSink(start)
+        write_zip(lesson_files(state, lesson_ids, translations), sink)
+        return sink.first_byte, sink.size
+
+    def in_memory(start):
+        # Like JSZip: the archive is complete before the first byte can be handed to the user
+        buffer = io.BytesIO()
+        write_zip(lesson_files(state, lesson_ids, translations), buffer)
+        data = buffer.getvalue()
+        return time.perf_counter() - start, len(data)
+
+    print("=" * 80)
+    print(f"📦 Export benchmark: {len(lesson_ids)} lessons, {args.code_kb} KB of code each, {args.runs} runs")
+    print("=" * 80)
+    print(f"{'Path':<28} {'1st byte ms':>10} {'total ms':>10} {'size KB':>10} {'peak KB':>10}")
+    print_row('Streamed (server)', *measure(streamed, args.runs))
+    print_row('In memory (JSZip-style)', *measure(in_memory, args.runs))
+
+    if args.url:
+        body = json.dumps(state).encode('utf-8')
+        first_bytes, totals = [], []
+        for _ in range(args.runs):
+            req = urllib.request.Request(args.url.rstrip('/') + '/api/export', data=body,
+                                         headers={'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read(1)
+                first_bytes.append(time.perf_counter() - start)
+                size = 1 + len(response.read())
+            totals.append(time.perf_counter() - start)
+        print_row('HTTP /api/export', statistics.median(first_bytes), statistics.median(totals), size, 0)
+
+    # The browser path also has to download JSZip before it can start
+    try:
+        with urllib.request.urlopen(JSZIP_URL, timeout=5) as response:
+            jszip_size = len(response.read())
+        print(f"\n📥 JSZip download needed by the browser path: {jszip_size / 1024:.0f} KB")
+    except (urllib.error.URLError, OSError):
+        print("\n📥 JSZip download size: unavailable (no network)")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Range requests for static files (206 Partial Content).
+
+A download that breaks halfway (a large page over flaky Wi-Fi) can be
+resumed with a Range header instead of starting again from byte zero.
+Every static file is sent with Accept-Ranges and an ETag, and a GET with
+Range: bytes=... gets only those bytes: one range as a plain 206, several
+as multipart/byteranges. If-Range makes the request conditional, so a
+file that changed since the first part was fetched is sent whole again
+instead of being stitched together from two versions. The ETag also
+answers If-None-Match with 304 Not Modified.
+
+file_response() works out the response to a GET or HEAD of a file (304,
+206, 416 or a plain 200) in one place for every engine. The body is a
+list of segments, either bytes (multipart headers) or (offset, count)
+ranges of the file, so each engine sends them its own way: the WSGI app
+(which the threaded server runs) reads them with RangeReader, and the
+asyncio engine sendfiles the file ranges.
+"""
+
+import dataclasses
+import email.utils
+import re
+import secrets
+import sys
+from collections import deque
+
+# Ranges served in one multipart response; a Range header asking for more is ignored (the whole file is sent)
+MAX_RANGES = 16
+
+RANGE_SPEC_PATTERN = re.compile(r'(\d+)-(\d*)|-(\d+)', re.ASCII)
+
+
+@dataclasses.dataclass
+class PartialContent:
+    """A 206 (or 416) response to a Range request: its status, headers (Content-Length is added) and body segments."""
+
+    status: int
+    headers: list
+    segments: list  # bytes, or (offset, count) ranges of the file
+
+    def __post_init__(self):
+        length = sum(len(segment) if isinstance(segment, bytes) else segment[1] for segment in self.segments)
+        self.headers = self.headers + [('Content-Length', str(length))]
+
+
+def file_etag(stat):
+    """Strong validator for a file: changes whenever the file is written."""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def file_headers(stat):
+    """Headers sent with every static file, so clients know they can resume it."""
+    return [('Accept-Ranges', 'bytes'), ('ETag', file_etag(stat))]
+
+
+def not_modified(if_none_match, stat):
+    """Whether an If-None-Match header lists the file's current ETag, so the client's copy is current (304)."""
+    if not if_none_match:
+        return False
+    etag = file_etag(stat)
+    return if_none_match.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+
+def parse_range(header, size):
+    """
+    The byte ranges a Range header asks for in a file of `size` bytes, as
+    (start, end) pairs with end exclusive. None if the header is ignored
+    (not bytes, malformed, or too many ranges); an empty list if none of
+    the ranges is satisfiable. Overlapping ranges are merged.
+    """
+    unit, sep, specs = header.partition('=')
+    if not sep or unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        match = RANGE_SPEC_PATTERN.fullmatch(spec)
+        if match is None:
+            return None
+        first, last, suffix = match.groups()
+        if suffix is not None:
+            # bytes=-500 is the last 500 bytes
+            if int(suffix) and size:
+                ranges.append((max(size - int(suffix), 0), size))
+            continue
+        if last and int(last) < int(first):
+            return None
+        if int(first) < size:
+            ranges.append((int(first), min(int(last) + 1, size) if last else size))
+    if len(ranges) > MAX_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(if_range, stat):
+    """Whether an If-Range validator (an ETag or a Last-Modified date) still matches the file."""
+    if if_range.startswith('"'):
+        return if_range == file_etag(stat)
+    try:
+        date = email.utils.parsedate_to_datetime(if_range)
+    except (TypeError, ValueError):
+        return False
+    return date.timestamp() == int(stat.st_mtime)
+
+
+def partial_content(method, range_header, if_range, stat, content_type):
+    """
+    The partial response to a request for a file, or None when the whole
+    file is sent: not a GET with a Range header, an If-Range that no longer
+    matches, or a Range header that is ignored.
+    """
+    if method != 'GET' or not range_header:
+        return None
+    if if_range and not if_range_matches(if_range, stat):
+        return None
+    size = stat.st_size
+    ranges = parse_range(range_header, size)
+    if ranges is None:
+        return None
+    if not ranges:
+        return PartialContent(416, [('Content-Range', f'bytes */{size}')], [])
+    if len(ranges) == 1:
+        (start, end), = ranges
+        return PartialContent(206, [('Content-Type', content_type),
+                                    ('Content-Range', f'bytes {start}-{end - 1}/{size}')], [(start, end - start)])
+    boundary = secrets.token_hex(16)
+    segments = []
+    for start, end in ranges:
+        segments.append((f'--{boundary}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n').encode('latin-1'))
+        segments.append((start, end - start))
+        segments.append(b'\r\n')
+    segments.append(f'--{boundary}--\r\n'.encode('latin-1'))
+    return PartialContent(206, [('Content-Type', f'multipart/byteranges; boundary={boundary}')], segments)
+
+
+def file_response(method, stat, content_type, if_none_match=None, range_header=None, if_range=None):
+    """
+    The response to a GET or HEAD of a file as (status, headers, segments):
+    304 when the client's copy is current, 206 or 416 for a Range request,
+    otherwise 200 with the whole file (no segments for HEAD).
+    """
+    last_modified = ('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+    if not_modified(if_none_match, stat):
+        return 304, file_headers(stat) + [last_modified], []
+    partial = partial_content(method, range_header, if_range, stat, content_type)
+    if partial is not None:
+        return partial.status, partial.headers + file_headers(stat) + [last_modified], partial.segments
+    headers = [('Content-Type', content_type), ('Content-Length', str(stat.st_size)), *file_headers(stat), last_modified]
+    return 200, headers, [(0, stat.st_size)] if method == 'GET' and stat.st_size else []
+
+
+class RangeReader:
+    """File-like object reading the segments of a partial response from the open file."""
+
+    def __init__(self, f, segments):
+        self._f = f
+        self._segments = deque(segments)
+
+    def read(self, size=-1):
+        wanted = size if size >= 0 else sys.maxsize
+        chunks = []
+        while self._segments and wanted:
+            segment = self._segments.popleft()
+            if isinstance(segment, bytes):
+                chunk, rest = segment[:wanted], segment[wanted:]
+            else:
+                offset, count = segment
+                self._f.seek(offset)
+                chunk = self._f.read(min(count, wanted))
+                if not chunk:
+                    # The file was truncated while being sent: end the body (the client sees it is short)
+                    self._segments.clear()
+                    break
+                rest = (offset + len(chunk), count - len(chunk)) if count > len(chunk) else b''
+            if rest:
+                self._segments.appendleft(rest)
+            chunks.append(chunk)
+            wanted -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self._f.close()
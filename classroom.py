@@ -0,0 +1,151 @@
+"""
+Live classroom state for server.py's /api/classroom endpoints and the
+instructor dashboard (dashboard.html).
+
+Students' apps send a small beacon (name, lesson, completed lessons)
+whenever they move to another lesson. Beacons only update an in-memory
+table; a single broadcaster thread turns the table into one JSON
+snapshot per interval and hands it to every connected dashboard over
+Server-Sent Events. However many beacons arrive in an interval, each
+dashboard gets at most one push.
+"""
+
+import json
+import queue
+import threading
+import time
+
+# Longest name kept from a beacon
+MAX_NAME_LENGTH = 100
+
+
+def validate_beacon(data):
+    """Check a beacon from the app and return it normalized. Raises ValueError if malformed."""
+    if not isinstance(data, dict):
+        raise ValueError('beacon must be a JSON object')
+    name = data.get('name', '')
+    lesson_index = data.get('lessonIndex', 0)
+    completed = data.get('completedLessons', [])
+    if not isinstance(name, str):
+        raise ValueError('name must be a string')
+    if not isinstance(lesson_index, int) or isinstance(lesson_index, bool) or lesson_index < 0:
+        raise ValueError('lessonIndex must be a non-negative integer')
+    if not isinstance(completed, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in completed):
+        raise ValueError('completedLessons must be a list of lesson indexes')
+    return {
+        'name': name.strip()[:MAX_NAME_LENGTH],
+        'lessonIndex': lesson_index,
+        'completedLessons': sorted(set(completed)),
+    }
+
+
+class Subscriber:
+    """One connected dashboard. Only the newest snapshot is kept, so a slow client never falls behind."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=1)
+
+    def push(self, snapshot):
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._queue.put_nowait(snapshot)
+        except queue.Full:
+            pass  # another snapshot was pushed at the same moment; either is current
+
+    def next(self, timeout=None):
+        """Next snapshot, or None if none arrived within timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ClassroomBroadcaster:
+    """Latest state per student, broadcast to subscribers as coalesced snapshots."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._students = {}
+        self._subscribers = set()
+        self._dirty_since = None  # time of the oldest beacon not yet broadcast
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.stats = {
+            'beacons': 0,
+            'broadcasts': 0,
+            'last_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='classroom-broadcast', daemon=True)
+        self._thread.start()
+
+    @property
+    def clients(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def update(self, student_id, beacon):
+        """Record a student's beacon; it reaches dashboards with the next snapshot."""
+        now = time.time()
+        with self._lock:
+            self._students[student_id] = dict(beacon, lastSeen=now)
+            self.stats['beacons'] += 1
+            if self._dirty_since is None:
+                self._dirty_since = time.perf_counter()
+
+    def subscribe(self):
+        """Register a dashboard; it receives the current snapshot straight away."""
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+            snapshot = self._snapshot or self._build_snapshot()
+        subscriber.push(snapshot)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def broadcast(self):
+        """Send a snapshot to every subscriber if anything changed. Returns True if one was sent."""
+        with self._lock:
+            if self._dirty_since is None:
+                return False
+            dirty_since, self._dirty_since = self._dirty_since, None
+            self._snapshot = snapshot = self._build_snapshot()
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(snapshot)
+        latency_ms = (time.perf_counter() - dirty_since) * 1000
+        with self._lock:
+            self.stats['broadcasts'] += 1
+            self.stats['last_latency_ms'] = latency_ms
+            self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], latency_ms)
+        return True
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _build_snapshot(self):
+        # Called with the lock held
+        students = [
+            {
+                'id': student_id,
+                'name': record['name'],
+                'lessonIndex': record['lessonIndex'],
+                'completed': len(record['completedLessons']),
+                'lastSeen': record['lastSeen'],
+            }
+            for student_id, record in self._students.items()
+        ]
+        students.sort(key=lambda student: (student['name'].lower(), student['id']))
+        return json.dumps({'students': students, 'time': time.time()})
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.broadcast()
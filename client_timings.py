@@ -0,0 +1,87 @@
+"""
+Startup timings reported by students' browsers, for server.py's
+/api/timings endpoint (enabled with --metrics).
+
+The app records performance marks at key points of startup and sends
+them once per page load with navigator.sendBeacon. The server keeps the
+most recent samples of each mark in memory and reports percentiles on
+/api/timings and /metrics, next to the server's own metrics.
+"""
+
+import math
+import threading
+from collections import deque
+
+# Marks sent by index.html, in milliseconds since navigation start
+TIMING_MARKS = ('script-start', 'translations-loaded', 'app-render', 'first-preview')
+
+# Longest timing accepted (first-preview includes the time the student takes to start a lesson)
+MAX_TIMING_MS = 60 * 60 * 1000
+
+QUANTILES = (0.5, 0.75, 0.95, 0.99)
+
+
+def validate_timings(data):
+    """Check a timings beacon ({marks: {name: ms}}) and return the known marks. Raises ValueError if malformed."""
+    if not isinstance(data, dict) or not isinstance(data.get('marks'), dict):
+        raise ValueError('timings must be an object with a marks object')
+    marks = {}
+    for name, value in data['marks'].items():
+        if name not in TIMING_MARKS:
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value <= MAX_TIMING_MS:
+            raise ValueError(f'{name} must be a number of milliseconds')
+        marks[name] = float(value)
+    if not marks:
+        raise ValueError('no known marks')
+    return marks
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class ClientTimings:
+    """Sliding window of recent samples per mark, with all-time counts and sums."""
+
+    def __init__(self, window=1000):
+        self._samples = {name: deque(maxlen=window) for name in TIMING_MARKS}
+        self._counts = dict.fromkeys(TIMING_MARKS, 0)
+        self._sums = dict.fromkeys(TIMING_MARKS, 0.0)
+        self._lock = threading.Lock()
+
+    def record(self, marks):
+        with self._lock:
+            for name, value in marks.items():
+                self._samples[name].append(value)
+                self._counts[name] += 1
+                self._sums[name] += value
+
+    def summary(self):
+        """mark -> {count, sum, p50, p75, p95, p99} (percentiles over the recent window)."""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counts, sums = dict(self._counts), dict(self._sums)
+        result = {}
+        for name in TIMING_MARKS:
+            if not counts[name]:
+                continue
+            entry = {'count': counts[name], 'sum': round(sums[name], 3)}
+            for q in QUANTILES:
+                entry[f'p{round(q * 100)}'] = percentile(samples[name], q)
+            result[name] = entry
+        return result
+
+    def collect(self):
+        """Series for metrics.Metrics.add_collector (a Prometheus summary)."""
+        series = []
+        for name, entry in self.summary().items():
+            labels = (('mark', name),)
+            for q in QUANTILES:
+                series.append(('client_timing_milliseconds', labels + (('quantile', str(q)),),
+                               entry[f'p{round(q * 100)}']))
+            series.append(('client_timing_milliseconds_sum', labels, entry['sum']))
+            series.append(('client_timing_milliseconds_count', labels, entry['count']))
+        return series
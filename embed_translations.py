@@ -3,57 +3,322 @@
 Create a standalone version of index.html with embedded translations.
 This version can be opened directly in a browser without a server.
 
+Also writes the flat translation table used by t() and the precache
+manifest used by the service worker (sw.js) to cache the app shell for
+offline use.
+
 Usage:
     python3 embed_translations.py
 
 Output:
     index-standalone.html (single file that works without a server)
+    translation-table.json (flat key -> string table per language)
+    precache-manifest.json (app shell file list with content hashes, and what to preload)
+    assets/ (content-hashed copies of the page's files, e.g. styles.<hash>.css)
+    asset-manifest.json (file name -> fingerprinted copy)
+    index-fingerprinted.html (index.html referring to the fingerprinted copies)
 """
 
+import hashlib
 import json
+import os
 import re
+import shutil
+
+TRANSLATION_TABLE = 'translation-table.json'
+
+# Entry in the translation table holding source_hash() of the translations.json it was built from
+SOURCE_HASH_KEY = '_source_hash'
+
+LESSON_VALIDATORS = 'lesson-validators.json'
+
+# Files that make up the app shell, cached by the service worker
+APP_SHELL_FILES = ['index.html', 'styles.css', 'translations.json', LESSON_VALIDATORS, TRANSLATION_TABLE]
+
+PRECACHE_MANIFEST = 'precache-manifest.json'
+
+# Files the page loads that get content-hashed copies, which browsers may cache forever
+FINGERPRINTED_FILES = ['styles.css', 'translations.json', TRANSLATION_TABLE, LESSON_VALIDATORS]
+
+ASSETS_DIR = 'assets'
+
+ASSET_MANIFEST = 'asset-manifest.json'
+
+FINGERPRINTED_PAGE = 'index-fingerprinted.html'
+
+# Sections of translations.json that t() looks keys up in (glossary and lessons are read directly)
+TRANSLATION_KEY_SECTIONS = ['ui', 'categories']
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+def flatten_translations(translations_data):
+    """
+    Flatten the t() sections of translations.json into one table per language:
+    {lang: {'ui.title': ..., 'categories.css': ...}}. Keys missing from a
+    language fall back to English. Strings with {name} placeholders are
+    pre-split into a list alternating literal text and parameter names, so
+    "Hi {name}!" becomes ["Hi ", "name", "!"].
+    """
+    def flatten(node, prefix, table):
+        for key, value in node.items():
+            path = f'{prefix}.{key}'
+            if isinstance(value, dict):
+                flatten(value, path, table)
+            elif isinstance(value, str):
+                table[path] = value
+        return table
+
+    def sections(lang):
+        table = {}
+        for section in TRANSLATION_KEY_SECTIONS:
+            flatten(translations_data.get(lang, {}).get(section, {}), section, table)
+        return table
+
+    english = sections('en')
+    tables = {}
+    for lang in translations_data:
+        table = {**english, **sections(lang)}
+        tables[lang] = {
+            key: (PLACEHOLDER_PATTERN.split(value) if PLACEHOLDER_PATTERN.search(value) else value)
+            for key, value in table.items()
+        }
+    return tables
+
+
+def write_output(path, content):
+    """
+    Write a build output under a temporary name, then move it into place: a
+    running server (dev mode rebuilds, a reload's new server) keeps serving
+    these files, and must never send one half-written. A file that would not
+    change is left alone, so a reload's new server does not touch the files
+    the old one is still serving and their ETags stay valid.
+    """
+    try:
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(path + '.tmp', 'w') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def source_hash(data):
+    """
+    32-bit FNV-1a hash of some bytes, as 8 hex digits. index.html computes
+    the same hash of the translations.json it loads, and ignores a table
+    built from a different one (edited without rerunning this script).
+    """
+    value = 0x811c9dc5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xffffffff
+    return f'{value:08x}'
+
+
+def build_translation_table(output_path=TRANSLATION_TABLE, directory='.'):
+    """Write the flat translation table that t() looks keys up in, with the hash of its source."""
+    with open(os.path.join(directory, 'translations.json'), 'rb') as f:
+        source = f.read()
+    translations_data = json.loads(source)
+
+    table = flatten_translations(translations_data)
+
+    write_output(os.path.join(directory, output_path),
+                 json.dumps({SOURCE_HASH_KEY: source_hash(source), **table}, ensure_ascii=False, separators=(',', ':')))
+
+    return table
 
-print("=" * 80)
-print("Creating standalone version with embedded translations...")
-print("=" * 80)
 
-# Read files
-with open('index.html', 'r') as f:
-    html_content = f.read()
+def build_standalone(output_path='index-standalone.html', directory='.'):
+    """Write index.html with translations.json and the lesson validators embedded in place of the fetch calls."""
+    # Read files
+    with open(os.path.join(directory, 'index.html'), 'r') as f:
+        html_content = f.read()
 
-with open('translations.json', 'r') as f:
-    translations_data = json.load(f)
+    with open(os.path.join(directory, 'translations.json'), 'r') as f:
+        translations_data = json.load(f)
 
-# Find the fetch code block and replace it with embedded translations
-pattern = r"// Load translations from external JSON file\s+let translations = \{\};\s+let translationsLoaded = false;\s+// Load translations\.json\s+fetch\('translations\.json'\)[\s\S]*?\}\);"
+    with open(os.path.join(directory, LESSON_VALIDATORS), 'r') as f:
+        validators_data = json.load(f)
 
-embedded_code = f"""// Embedded translations (standalone version)
+    # Find the fetch code block and replace it with embedded translations
+    pattern = r"// Translation system - load all content from external JSON file\s+let translations = \{\};[\s\S]*?// End of translations loading"
+
+    embedded_code = f"""// Embedded translations (standalone version)
         const translations = {json.dumps(translations_data, indent=10, ensure_ascii=False)};
+        const translationTable = {json.dumps(flatten_translations(translations_data), ensure_ascii=False)};
         const translationsLoaded = true;"""
 
-# Replace fetch code with embedded translations
-new_content = re.sub(pattern, embedded_code, html_content)
+    # Replace fetch code with embedded translations (lambda so backslashes in the JSON stay literal)
+    new_content = re.sub(pattern, lambda match: embedded_code, html_content)
 
-# Write standalone version
-with open('index-standalone.html', 'w') as f:
-    f.write(new_content)
+    # Same for the lesson validators
+    validators_pattern = r"let lessonValidators = \{\};[\s\S]*?// End of lesson validators loading"
+    embedded_validators = f"""const lessonValidators = compileLessonValidators({json.dumps(validators_data, ensure_ascii=False)});
+        const lessonValidatorsLoaded = Promise.resolve(true);"""
+    new_content = re.sub(validators_pattern, lambda match: embedded_validators, new_content)
 
-# Get file sizes
-import os
-original_size = os.path.getsize('index.html')
-standalone_size = os.path.getsize('index-standalone.html')
-trans_size = os.path.getsize('translations.json')
+    # Write standalone version
+    write_output(os.path.join(directory, output_path), new_content)
+
+    return output_path
+
+
+def file_hash(path):
+    """Short sha256 content hash of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def external_scripts(html_path='index.html'):
+    """CDN script URLs referenced from index.html, including lazily loaded ones."""
+    with open(html_path, 'r') as f:
+        html_content = f.read()
+    urls = re.findall(r'https://unpkg\.com/[^\s"\'`]+\.js', html_content)
+    return list(dict.fromkeys(urls))
+
+
+def preload_resources(html_path='index.html'):
+    """
+    What index.html loads right away, in order: stylesheets, <script src>
+    tags and the JSON files fetched at startup. Each entry has the url, the
+    preload destination ('as') and whether it is fetched with CORS. Lazily
+    loaded scripts (JSZip) are left out, since most visits never load them.
+    """
+    with open(html_path, 'r') as f:
+        html_content = f.read()
+    head = html_content.split('</head>', 1)[0]
+    resources = [
+        {'url': url, 'as': 'style', 'crossorigin': False}
+        for url in re.findall(r'<link rel="stylesheet" href="([^"]+)"', head)
+    ]
+    resources += [
+        {'url': url, 'as': 'script', 'crossorigin': 'crossorigin' in attributes.split()}
+        for attributes, url in re.findall(r'<script([^>]*?)\ssrc="([^"]+)"', head)
+    ]
+    # fetch() always uses CORS mode, so its preload needs crossorigin to be reused
+    resources += [
+        {'url': url, 'as': 'fetch', 'crossorigin': True}
+        for url in dict.fromkeys(re.findall(r"fetch\('([\w./-]+\.json)'\)", html_content))
+    ]
+    return resources
+
+
+def build_fingerprinted_assets(output_dir=ASSETS_DIR, manifest_path=ASSET_MANIFEST, page_path=FINGERPRINTED_PAGE,
+                               directory='.'):
+    """
+    Write a content-hashed copy of each of FINGERPRINTED_FILES to output_dir
+    (styles.css -> assets/styles.<hash>.css), a copy of index.html that
+    refers to them, and the manifest mapping each file to its copy. Copies
+    from the previous build are kept, so a page loaded just before a rebuild
+    still finds its files; older ones are removed. Paths are relative to
+    `directory`, and so are the copies' URLs in the manifest.
+    """
+    try:
+        with open(os.path.join(directory, manifest_path), 'r') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    os.makedirs(os.path.join(directory, output_dir), exist_ok=True)
+    assets = {}
+    for name in FINGERPRINTED_FILES:
+        stem, extension = os.path.splitext(name)
+        source = os.path.join(directory, name)
+        assets[name] = f'{output_dir}/{stem}.{file_hash(source)}{extension}'
+        copy = os.path.join(directory, assets[name])
+        if not os.path.exists(copy):
+            # Copied under a temporary name first: a fingerprinted file is never seen half-written
+            shutil.copyfile(source, copy + '.tmp')
+            os.replace(copy + '.tmp', copy)
+
+    keep = {os.path.basename(path) for path in [*assets.values(), *previous.values()]}
+    stems = '|'.join(re.escape(os.path.splitext(name)[0]) for name in FINGERPRINTED_FILES)
+    for entry in os.listdir(os.path.join(directory, output_dir)):
+        if re.fullmatch(rf'(?:{stems})\.[0-9a-f]{{16}}\.\w+', entry) and entry not in keep:
+            os.remove(os.path.join(directory, output_dir, entry))
+
+    # Only quoted references (the <link> tag and the fetch calls), not file names in comments
+    with open(os.path.join(directory, 'index.html'), 'r') as f:
+        html_content = f.read()
+    for name, url in assets.items():
+        html_content = re.sub(r'([\'"])' + re.escape(name) + r'\1',
+                              lambda match: match.group(1) + url + match.group(1), html_content)
+    write_output(os.path.join(directory, page_path), html_content)
+    write_output(os.path.join(directory, manifest_path), json.dumps(assets, indent=2) + '\n')
+
+    return assets
+
+
+def build_precache_manifest(output_path=PRECACHE_MANIFEST, assets=None, directory='.'):
+    """
+    Write the service worker precache manifest: every app shell file with its
+    content hash, plus the external scripts to cache on first use. The service
+    worker re-fetches a cached file only when its hash changes. The manifest
+    also lists what index.html loads at startup, which server.py announces
+    with Link: rel=preload headers.
+
+    With `assets` (from build_fingerprinted_assets) the shell is the page
+    served in place of index.html plus the fingerprinted copies.
+    """
+    page = FINGERPRINTED_PAGE if assets else 'index.html'
+    files = []
+    for name in APP_SHELL_FILES:
+        url = (assets or {}).get(name, name)
+        path = os.path.join(directory, page if name == 'index.html' else url)
+        files.append({'url': url, 'hash': file_hash(path), 'size': os.path.getsize(path)})
+    version = hashlib.sha256(
+        ''.join(entry['url'] + entry['hash'] for entry in files).encode('utf-8')
+    ).hexdigest()[:16]
+    manifest = {
+        'version': version,
+        'files': files,
+        'external': external_scripts(os.path.join(directory, page)),
+        'preload': preload_resources(os.path.join(directory, page)),
+    }
+
+    write_output(os.path.join(directory, output_path), json.dumps(manifest, indent=2) + '\n')
+
+    return manifest
+
+
+def main():
+    print("=" * 80)
+    print("Creating standalone version with embedded translations...")
+    print("=" * 80)
+
+    build_standalone()
+    table = build_translation_table()
+    manifest = build_precache_manifest()
+    assets = build_fingerprinted_assets()
+
+    # Get file sizes
+    original_size = os.path.getsize('index.html')
+    standalone_size = os.path.getsize('index-standalone.html')
+    trans_size = os.path.getsize('translations.json')
+
+    print(f"\n✅ Created: index-standalone.html")
+    print(f"✅ Created: {TRANSLATION_TABLE} ({len(table['en'])} keys per language)")
+    print(f"✅ Created: {PRECACHE_MANIFEST} (version {manifest['version']}, {len(manifest['files'])} files)")
+    print(f"✅ Created: {FINGERPRINTED_PAGE} and {ASSET_MANIFEST} ({', '.join(assets.values())})")
+    print(f"\n📊 File Sizes:")
+    print(f"   index.html (requires server):  {original_size:>8,} bytes ({original_size/1024:>6.1f} KB)")
+    print(f"   index-standalone.html:         {standalone_size:>8,} bytes ({standalone_size/1024:>6.1f} KB)")
+    print(f"   translations.json:             {trans_size:>8,} bytes ({trans_size/1024:>6.1f} KB)")
 
-print(f"\n✅ Created: index-standalone.html")
-print(f"\n📊 File Sizes:")
-print(f"   index.html (requires server):  {original_size:>8,} bytes ({original_size/1024:>6.1f} KB)")
-print(f"   index-standalone.html:         {standalone_size:>8,} bytes ({standalone_size/1024:>6.1f} KB)")
-print(f"   translations.json:             {trans_size:>8,} bytes ({trans_size/1024:>6.1f} KB)")
+    print(f"\n💡 Usage:")
+    print(f"   • index.html: Use with a local server (python3 -m http.server)")
+    print(f"   • index-standalone.html: Can be opened directly (double-click)")
+    print(f"   • {FINGERPRINTED_PAGE}: Served as index.html by server.py --fingerprint")
 
-print(f"\n💡 Usage:")
-print(f"   • index.html: Use with a local server (python3 -m http.server)")
-print(f"   • index-standalone.html: Can be opened directly (double-click)")
+    print(f"\n✅ Done!")
+    print("=" * 80)
 
-print(f"\n✅ Done!")
-print("=" * 80)
 
+if __name__ == '__main__':
+    main()
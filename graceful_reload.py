@@ -0,0 +1,65 @@
+"""
+Zero-downtime reload for server.py: kill -USR2 <pid>.
+
+The running server starts a new copy of itself with the same command
+line and hands it the listening socket, which the new process inherits
+as an open file descriptor instead of binding the port again. The
+kernel keeps queueing connections on that socket the whole time, so
+none are refused. Once the new server reports that it is ready, the old
+one stops accepting, finishes the requests it is in the middle of
+(closing idle keep-alive connections, which browsers simply reopen),
+and exits. If the new server fails to start, for example because of a
+broken translations.json, the old one keeps serving.
+"""
+
+import os
+import select
+import socket
+import subprocess
+import sys
+
+# Environment variables passing the listening socket and the readiness pipe to the new server
+LISTEN_FD_ENV = 'SERVER_LISTEN_FD'
+READY_FD_ENV = 'SERVER_READY_FD'
+
+# Seconds the new server has to start (rebuilding the translation table and precache manifest)
+STARTUP_TIMEOUT = 60
+
+# Seconds the old server waits for in-flight requests before exiting anyway
+DRAIN_TIMEOUT = 30
+
+
+def inherited_socket():
+    """The listening socket handed over by the server being replaced, or None."""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is None:
+        return None
+    return socket.socket(fileno=int(fd))
+
+
+def notify_ready():
+    """Tell the server being replaced (if any) that this one is accepting connections."""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if fd is not None:
+        os.write(int(fd), b'ready')
+        os.close(int(fd))
+
+
+def start_successor(listen_socket, argv, timeout=STARTUP_TIMEOUT):
+    """Start `argv` with listen_socket. Returns the process once it is serving, or None if it failed to start."""
+    read_fd, write_fd = os.pipe()
+    fd = listen_socket.fileno()
+    env = dict(os.environ, **{LISTEN_FD_ENV: str(fd), READY_FD_ENV: str(write_fd)})
+    process = subprocess.Popen([sys.executable, *argv], env=env, pass_fds=(fd, write_fd))
+    os.close(write_fd)
+    try:
+        # EOF without 'ready' means the new server exited during startup
+        readable, _, _ = select.select([read_fd], [], [], timeout)
+        ready = bool(readable) and os.read(read_fd, 16) == b'ready'
+    finally:
+        os.close(read_fd)
+    if not ready:
+        process.kill()
+        process.wait()
+        return None
+    return process
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Grade many student submissions with the same rules as the Verify button.
+
+The rules are loaded from lesson-validators.json, which index.html also
+uses, so a submission passes here exactly when it would pass in the
+browser. Submissions are graded across a pool of worker processes and
+each result is printed as soon as it is ready.
+
+Usage:
+    python3 grade_submissions.py SUBMISSIONS [--lesson ID] [--workers N] [--summary-only]
+    python3 grade_submissions.py - < submissions.jsonl
+
+SUBMISSIONS can be:
+    • a directory: every <lesson-id>.html file (as in the "Download all my
+      files" ZIP, one folder per student) or <lesson-id>/<student>.html file
+    • a JSONL file, or '-' for stdin: one {"lesson": ..., "code": ...,
+      "student": ...} object per line
+
+Output:
+    One JSON line per submission on stdout:
+        {"student": ..., "lesson": ..., "passed": true}
+    Per-lesson pass rates and throughput on stderr. A record that cannot be
+    graded (bad JSON, no lesson, code that is not a string, an unreadable
+    file) gets "passed": false and an "error" instead of stopping the run
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+VALIDATORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lesson-validators.json')
+
+# Submissions sent to a worker process at a time
+CHUNK_SIZE = 64
+
+# Chunks submitted ahead per worker process: enough to keep every worker busy, while the input
+# (possibly an endless stream on stdin) is only read as fast as it is graded
+CHUNKS_PER_WORKER = 2
+
+
+def compile_rule(rule):
+    """Turn a lesson-validators.json rule into a function code -> bool (same semantics as index.html)."""
+    if 'match' in rule:
+        regex = re.compile(rule['match'], re.IGNORECASE)
+        return lambda code: regex.search(code) is not None
+    if 'all' in rule:
+        parts = [compile_rule(part) for part in rule['all']]
+        return lambda code: all(part(code) for part in parts)
+    if 'any' in rule:
+        parts = [compile_rule(part) for part in rule['any']]
+        return lambda code: any(part(code) for part in parts)
+    if 'before' in rule:
+        first, second = (re.compile(pattern, re.IGNORECASE) for pattern in rule['before'])
+
+        def before(code):
+            first_match = first.search(code)
+            second_match = second.search(code)
+            return bool(first_match and second_match and first_match.start() < second_match.start())
+        return before
+    raise ValueError(f'Unknown validator rule: {rule!r}')
+
+
+def load_validators(path=VALIDATORS_PATH):
+    """Lesson id -> validator function, from lesson-validators.json."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {lesson_id: compile_rule(rule) for lesson_id, rule in data['lessons'].items()}
+
+
+def find_submissions(directory, lesson_ids, lesson=None):
+    """Yield (student, lesson, path) for the submission files in a directory tree."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() != '.html':
+                continue
+            path = os.path.join(root, name)
+            parent = os.path.relpath(root, directory)
+            if lesson is not None:
+                yield os.path.relpath(path, directory), lesson, path
+            elif stem in lesson_ids:
+                # <student>/<lesson-id>.html
+                yield parent, stem, path
+            elif os.path.basename(root) in lesson_ids:
+                # <lesson-id>/<student>.html
+                yield stem, os.path.basename(root), path
+            else:
+                print(f"⚠️  Skipping {path}: no lesson id in its name", file=sys.stderr)
+
+
+def read_jsonl(stream, lesson=None):
+    """Yield submission dicts from a JSONL stream. A line that is not a JSON object is graded as an error row."""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        student = f'line-{line_number}'
+        try:
+            submission = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {'student': student, 'error': f'invalid JSON: {e}'}
+            continue
+        if not isinstance(submission, dict):
+            yield {'student': student, 'error': 'not a JSON object'}
+            continue
+        if lesson is not None:
+            submission['lesson'] = lesson
+        submission.setdefault('student', student)
+        yield submission
+
+
+def read_jsonl_file(path, lesson=None):
+    """read_jsonl() for a file, closed once every line has been read."""
+    with open(path, 'r') as f:
+        yield from read_jsonl(f, lesson)
+
+
+def submission_error(submission):
+    """Why a submission record cannot be graded, or None."""
+    if 'error' in submission:
+        return submission['error']  # set by read_jsonl
+    if not isinstance(submission.get('lesson'), str):
+        return 'lesson must be a string'
+    if submission.get('code') is not None and not isinstance(submission['code'], str):
+        return 'code must be a string'
+    return None
+
+
+# Validators compiled once per worker process (see _init_worker)
+_validators = None
+
+
+def _init_worker(validators_path):
+    global _validators
+    _validators = load_validators(validators_path)
+
+
+def grade(submission):
+    """
+    Grade one submission dict; files are read in the worker so the parent
+    only passes paths. A record that cannot be graded gets passed: false
+    and an 'error', so one bad record never stops the run.
+    """
+    lesson = submission.get('lesson')
+    code = submission.get('code')
+    result = {'student': submission.get('student'), 'lesson': lesson if isinstance(lesson, str) else None}
+    error = submission_error(submission)
+    if error is None and code is None and 'path' in submission:
+        try:
+            with open(submission['path'], 'r', encoding='utf-8', errors='replace') as f:
+                code = f.read()
+        except OSError as e:
+            error = f'cannot read {submission["path"]}: {e.strerror}'
+    if error is None and lesson not in _validators:
+        error = 'unknown lesson'
+    if error is not None:
+        result['passed'] = False
+        result['error'] = error
+    else:
+        result['passed'] = _validators[lesson](code or '')
+    return result
+
+
+def grade_chunk(submissions):
+    return [grade(submission) for submission in submissions]
+
+
+def grade_all(submissions, workers=None, validators_path=VALIDATORS_PATH):
+    """
+    Yield grading results (in input order) using a process pool. Unlike
+    pool.map, which reads all of its input before the first result comes
+    back, only a bounded window of chunks is read ahead of the results.
+    """
+    workers = workers or os.cpu_count() or 1
+    submissions = iter(submissions)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(validators_path,)) as pool:
+        while True:
+            chunk = list(itertools.islice(submissions, CHUNK_SIZE))
+            if chunk:
+                pending.append(pool.submit(grade_chunk, chunk))
+            # The oldest chunk's results go out as soon as they are ready, or once the window is full
+            while pending and (not chunk or pending[0].done() or len(pending) >= workers * CHUNKS_PER_WORKER):
+                yield from pending.popleft().result()
+            if not chunk:
+                return
+
+
+def print_summary(counts, total, elapsed, invalid=0):
+    print("=" * 80, file=sys.stderr)
+    print(f"{'Lesson':<20} {'Passed':>8} {'Total':>8} {'Rate':>8}", file=sys.stderr)
+    for lesson_id in sorted(counts):
+        passed, count = counts[lesson_id]
+        print(f"{lesson_id:<20} {passed:>8} {count:>8} {passed / count:>8.0%}", file=sys.stderr)
+    if invalid:
+        print(f"\n⚠️  {invalid:,} records could not be graded (see their \"error\")", file=sys.stderr)
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"\n📊 Graded {total:,} submissions in {elapsed:.2f}s ({rate:,.0f}/s)", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grade student submissions with the lesson validators.')
+    parser.add_argument('submissions', help="directory of .html files, a .jsonl file, or '-' for JSONL on stdin")
+    parser.add_argument('--lesson', help='grade every submission against this lesson id')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--validators', default=VALIDATORS_PATH, help='path to lesson-validators.json')
+    parser.add_argument('--summary-only', action='store_true', help='only print the per-lesson summary')
+    args = parser.parse_args(argv)
+
+    lesson_ids = set(load_validators(args.validators))
+    if args.lesson is not None and args.lesson not in lesson_ids:
+        parser.error(f'unknown lesson id: {args.lesson}')
+
+    if args.submissions == '-':
+        submissions = read_jsonl(sys.stdin, args.lesson)
+    elif os.path.isdir(args.submissions):
+        submissions = (
+            {'student': student, 'lesson': lesson, 'path': path}
+            for student, lesson, path in find_submissions(args.submissions, lesson_ids, args.lesson)
+        )
+    else:
+        submissions = read_jsonl_file(args.submissions, args.lesson)
+
+    counts = {}
+    total = invalid = 0
+    start = time.perf_counter()
+    for result in grade_all(submissions, args.workers, args.validators):
+        total += 1
+        if result['lesson'] is None:
+            invalid += 1  # no lesson to count it under
+        else:
+            passed, count = counts.get(result['lesson'], (0, 0))
+            counts[result['lesson']] = (passed + result['passed'], count + 1)
+        if not args.summary_only:
+            print(json.dumps(result), flush=True)
+    print_summary(counts, total, time.perf_counter() - start, invalid)
+    return 0 if total else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Live reload for server.py --dev.
+
+While lessons are being written, one watcher thread polls the source
+files (index.html, styles.css, translations.json, the lesson validators)
+for a new modification time or size. Polling four files twice a second
+costs next to nothing, needs no extra package, and also sees edits on
+mounted folders (Docker, network shares) where inotify events never
+arrive. A change is only acted on once the files stop changing, since
+editors often save in several writes.
+
+app.py then reruns the build steps that depend on the changed files and
+publishes the new build version. Open pages are served a copy of
+index.html with a small script that follows the version over
+Server-Sent Events and reloads the page when it changes, including after
+the server was restarted with different files.
+"""
+
+import os
+import threading
+
+from classroom import Subscriber
+
+# Seconds between polls of the watched files
+WATCH_INTERVAL = 0.5
+
+DEV_PAGE = 'index-dev.html'
+
+# Added to the page in dev mode. The service worker is kept out, so a reload shows the files as they are now
+RELOAD_SCRIPT = """    <script>
+        // Live reload (server.py --dev): reload when the server reports a new build
+        if (navigator.serviceWorker) {
+            navigator.serviceWorker.getRegistrations().then(registrations => registrations.forEach(r => r.unregister()));
+            navigator.serviceWorker.register = () => Promise.resolve();
+        }
+        let buildVersion = null;
+        new EventSource('/api/dev/events').addEventListener('version', (event) => {
+            if (buildVersion !== null && event.data !== buildVersion) location.reload();
+            buildVersion = event.data;
+        });
+    </script>
+"""
+
+
+def build_dev_page(source='index.html', output_path=DEV_PAGE):
+    """Write a copy of the page with the live reload script at the end of its <head>."""
+    with open(source, 'r') as f:
+        html_content = f.read()
+    head, sep, rest = html_content.partition('</head>')
+    # Rewritten while the server is running: written under a temporary name, so it is never served half-written
+    with open(output_path + '.tmp', 'w') as f:
+        f.write(head + RELOAD_SCRIPT + sep + rest)
+    os.replace(output_path + '.tmp', output_path)
+    return output_path
+
+
+class FileWatcher:
+    """Polls files from one thread and calls on_change(paths) once changed files have settled."""
+
+    def __init__(self, paths, on_change, interval=WATCH_INTERVAL):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self.stats = {'changes': 0, 'errors': 0}
+        self._state = self._snapshot()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+
+    def _snapshot(self):
+        state = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                state[path] = None  # being replaced by an editor, or deleted
+        return state
+
+    def poll(self):
+        """Paths changed since the last poll, waiting until they stop changing."""
+        current = self._snapshot()
+        changed = set()
+        while current != self._state:
+            changed.update(path for path in self.paths if current[path] != self._state[path])
+            self._state = current
+            if self._stopped.wait(self.interval):
+                break
+            current = self._snapshot()
+        return sorted(changed)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            changed = self.poll()
+            if not changed:
+                continue
+            self.stats['changes'] += 1
+            try:
+                self.on_change(changed)
+            except Exception as e:  # e.g. translations.json saved half-edited; the next save tries again
+                self.stats['errors'] += 1
+                print(f"⚠️  Rebuild after changes to {', '.join(map(os.path.basename, changed))} failed: {e!r}")
+
+    def close(self):
+        self._stopped.set()
+
+
+class LiveReload:
+    """The current build version, pushed to every open page when it changes."""
+
+    def __init__(self, version):
+        self.version = version
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def clients(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, version):
+        with self._lock:
+            self.version = version
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(version)
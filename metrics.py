@@ -0,0 +1,191 @@
+"""
+Request metrics for server.py's /metrics endpoint, in the Prometheus text
+exposition format.
+
+Every request updates a few counters and a latency histogram, so the
+counters have to be cheap. Updates go to one of a fixed number of
+shards, each with its own lock. Each thread is dealt the next shard in
+turn the first time it records something, so request threads almost
+never wait on each other. The shards are only added up when
+/metrics is scraped.
+"""
+
+import bisect
+import itertools
+import threading
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Bucket bounds for histograms that are not latencies
+BUCKETS = {
+    'http_requests_per_connection': (0, 1, 2, 5, 10, 25, 50, 100),
+}
+
+SHARD_COUNT = 16
+
+# name -> (type, help) for everything exposed on /metrics
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Time to handle a request, by route.'),
+    'http_response_bytes_total': ('counter', 'Bytes sent in responses (headers and body), by route.'),
+    'http_active_connections': ('gauge', 'Client connections currently open.'),
+    'http_connections_total': ('counter', 'Client connections accepted.'),
+    'http_keepalive_reuses_total': ('counter', 'Requests that reused an open keep-alive connection.'),
+    'http_requests_per_connection': ('histogram', 'Requests served by each closed connection.'),
+    'http_admission_queue_depth': ('gauge', 'Connections waiting for a free slot (--max-connections).'),
+    'http_admission_queued_total': ('counter', 'Connections that had to wait for a free slot.'),
+    'http_admission_shed_total': ('counter', 'Connections answered 503 because the accept queue was full.'),
+    'async_active_connections': ('gauge', 'Connections open on the asyncio engine (including idle keep-alive).'),
+    'async_connections_total': ('counter', 'Connections accepted by the asyncio engine.'),
+    'async_keepalive_reuses_total': ('counter', 'Requests on the asyncio engine that reused a keep-alive connection.'),
+    'async_sendfile_bytes_total': ('counter', 'File bytes sent with sendfile by the asyncio engine.'),
+    'async_bridged_requests_total': ('counter', 'Requests the asyncio engine handed to the request handler thread.'),
+    'shortlink_cache_hits_total': ('counter', 'Short link lookups answered from the LRU cache.'),
+    'shortlink_cache_misses_total': ('counter', 'Short link lookups that went to SQLite.'),
+    'progress_saves_total': ('counter', 'Progress saves received.'),
+    'progress_saves_coalesced_total': ('counter', 'Progress saves replaced by a newer save before being written.'),
+    'progress_rows_written_total': ('counter', 'Progress rows written to SQLite.'),
+    'classroom_clients': ('gauge', 'Dashboards connected to the classroom event stream.'),
+    'classroom_broadcast_latency_seconds': ('gauge', 'Wait of the oldest beacon in the last classroom broadcast.'),
+    'access_log_written_total': ('counter', 'Access log records written.'),
+    'access_log_dropped_total': ('counter', 'Access log records dropped because the write queue was full.'),
+    'client_timing_milliseconds': ('summary', 'Startup timings reported by browsers, by performance mark.'),
+    'export_uncompressed_bytes_total': ('counter', 'Bytes of lesson files put into ZIP exports.'),
+    'export_compressed_bytes_total': ('counter', 'Bytes of ZIP exports sent.'),
+    'export_compression_ratio': ('gauge', 'Compressed / uncompressed size of all ZIP exports so far.'),
+}
+
+
+class _Shard:
+    __slots__ = ('lock', 'counters', 'histograms')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+
+class Metrics:
+    """Sharded counters, gauges and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, shards=SHARD_COUNT):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._collectors = []
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+
+    def _shard(self):
+        # Not threading.get_ident() % shards: on Linux idents are pthread addresses with the same low
+        # bits, which would put every thread on one shard
+        try:
+            return self._local.shard
+        except AttributeError:
+            self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+            return self._local.shard
+
+    def inc(self, name, labels=(), value=1):
+        """Add value to a counter (or gauge) for a tuple of (label, value) pairs."""
+        shard = self._shard()
+        key = (name, labels)
+        with shard.lock:
+            shard.counters[key] = shard.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        """Record one observation in a histogram."""
+        shard = self._shard()
+        key = (name, labels)
+        buckets = BUCKETS.get(name, LATENCY_BUCKETS)
+        index = bisect.bisect_left(buckets, value)
+        with shard.lock:
+            histogram = shard.histograms.get(key)
+            if histogram is None:
+                histogram = shard.histograms[key] = [0] * (len(buckets) + 2)
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def add_collector(self, collect):
+        """Register a function returning [(name, labels, value)] read at scrape time (e.g. store stats)."""
+        self._collectors.append(collect)
+
+    def snapshot(self):
+        """(counters, histograms) summed across shards."""
+        counters, histograms = {}, {}
+        for shard in self._shards:
+            with shard.lock:
+                shard_counters = list(shard.counters.items())
+                shard_histograms = [(key, list(values)) for key, values in shard.histograms.items()]
+            for key, value in shard_counters:
+                counters[key] = counters.get(key, 0) + value
+            for key, values in shard_histograms:
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                counters[(name, labels)] = value
+        return counters, histograms
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        counters, histograms = self.snapshot()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if kind == 'histogram':
+                series = sorted((labels, values) for (n, labels), values in histograms.items() if n == name)
+            elif kind == 'summary':
+                # Quantile series plus the matching _sum and _count series
+                names = (name, f'{name}_sum', f'{name}_count')
+                series = sorted((n, labels, value) for (n, labels), value in counters.items() if n in names)
+            else:
+                series = sorted((labels, value) for (n, labels), value in counters.items() if n == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'summary':
+                lines.extend(f'{n}{_format_labels(labels)} {_format_value(value)}' for n, labels, value in series)
+                continue
+            for labels, value in series:
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS.get(name, LATENCY_BUCKETS) + ('+Inf',), value[:-1]):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {value[-1]:.6f}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+                else:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class CountingWriter:
+    """Wraps a handler's wfile and counts the bytes written through it."""
+
+    def __init__(self, out):
+        self._out = out
+        self.bytes_written = 0
+
+    def write(self, data):
+        written = self._out.write(data)
+        self.bytes_written += len(data)
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self._out, name)
@@ -0,0 +1,96 @@
+"""
+Request profiling for server.py --profile.
+
+A configurable fraction of requests is run under cProfile and the stats
+are merged per route, so hot spots in the handlers show up under real
+load without attaching a debugger. The merged stats can be dumped at
+any time, through GET /api/profile or by sending the server SIGUSR1, as
+one pstats file per route (open with `python3 -m pstats` or snakeviz)
+plus a text summary of the top functions by cumulative time.
+
+Only one request is profiled at a time: a sampled request that arrives
+while another is being profiled runs normally and is counted as
+skipped. Event streams are never sampled (see app.EVENT_STREAM_ROUTES),
+since they would hold the profiler for as long as the page is open.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+
+class RequestProfiler:
+    """Samples requests under cProfile and keeps merged pstats per route."""
+
+    def __init__(self, rate, directory='profiles', top=20):
+        if not 0 < rate <= 1:
+            raise ValueError('profile rate must be between 0 and 1')
+        self.rate = rate
+        self.directory = directory
+        self.top = top
+        self._stats = {}  # route -> pstats.Stats
+        self._counts = {}  # route -> profiled requests
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def start(self):
+        """Start profiling the current request if it is sampled. Returns a profile to pass to finish(), or None."""
+        if random.random() >= self.rate:
+            return None
+        if not self._active.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, route):
+        """Stop a profile from start() and merge it into the route's stats."""
+        profile.disable()
+        self._active.release()
+        if route is None:
+            return  # connection closed without a request
+        with self._lock:
+            if route in self._stats:
+                self._stats[route].add(profile)
+            else:
+                self._stats[route] = pstats.Stats(profile)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def summary(self, top=None):
+        """Text report: for each route, the top functions by cumulative time."""
+        top = top or self.top
+        out = io.StringIO()
+        with self._lock:
+            out.write(f'Profiled requests per route (sample rate {self.rate:g}, {self.skipped} skipped while busy)\n')
+            for route in sorted(self._stats, key=lambda r: -self._stats[r].total_tt):
+                stats = self._stats[route]
+                out.write(f'\n=== {route}: {self._counts[route]} requests, {stats.total_tt:.3f}s total ===\n')
+                stats.stream = out
+                stats.sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+    def dump(self):
+        """Write <directory>/<route>.prof for every route and summary.txt. Returns the files written."""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        written = []
+        with self._lock:
+            routes = list(self._stats.items())
+            for route, stats in routes:
+                name = re.sub(r'[^A-Za-z0-9_.-]+', '_', route.strip('/')) or 'root'
+                path = os.path.join(self.directory, f'{stamp}-{name}.prof')
+                stats.dump_stats(path)
+                written.append(path)
+        path = os.path.join(self.directory, f'{stamp}-summary.txt')
+        with open(path, 'w') as f:
+            f.write(self.summary())
+        written.append(path)
+        return written
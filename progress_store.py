@@ -0,0 +1,197 @@
+"""
+SQLite-backed storage for student progress, used by server.py's
+/api/progress endpoint.
+
+The app saves progress on every keystroke, so writes are not sent to
+SQLite one by one. Each save replaces the student's pending record in
+memory, and a background thread writes all pending records in a single
+transaction every flush interval. The database runs in WAL mode so
+reads are not blocked while a batch is being written.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    lesson_index INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    language TEXT NOT NULL,
+    completed_lessons TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+# A batch flushed late (another --workers process, or a slow flush) never overwrites newer progress
+UPSERT = """
+INSERT INTO progress (student_id, name, lesson_index, code, language, completed_lessons, updated_at)
+VALUES (:student_id, :name, :lesson_index, :code, :language, :completed_lessons, :updated_at)
+ON CONFLICT(student_id) DO UPDATE SET
+    name = excluded.name,
+    lesson_index = excluded.lesson_index,
+    code = excluded.code,
+    language = excluded.language,
+    completed_lessons = excluded.completed_lessons,
+    updated_at = excluded.updated_at
+WHERE excluded.updated_at >= progress.updated_at
+"""
+
+
+def connect(path):
+    """Open a connection to the progress database in WAL mode."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # With WAL, NORMAL only syncs at checkpoints; a crash can lose the last batch but not corrupt the file
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(SCHEMA)
+    conn.commit()
+    return conn
+
+
+def validate_progress(data):
+    """
+    Check a progress payload from the app and return it normalized
+    (the same fields encodeState puts in the URL hash).
+    Raises ValueError if it is malformed.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('progress must be a JSON object')
+    name = data.get('name')
+    lesson_index = data.get('lessonIndex')
+    code = data.get('code', '')
+    language = data.get('language', 'en')
+    completed = data.get('completedLessons', [])
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('name is required')
+    if not isinstance(lesson_index, int) or isinstance(lesson_index, bool) or lesson_index < 0:
+        raise ValueError('lessonIndex must be a non-negative integer')
+    if not isinstance(code, str):
+        raise ValueError('code must be a string')
+    if not isinstance(language, str):
+        raise ValueError('language must be a string')
+    if not isinstance(completed, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in completed):
+        raise ValueError('completedLessons must be a list of lesson indexes')
+    return {
+        'name': name,
+        'lessonIndex': lesson_index,
+        'code': code,
+        'language': language,
+        'completedLessons': sorted(set(completed)),
+    }
+
+
+class ProgressStore:
+    """Student progress with in-memory write coalescing and batched flushes to SQLite."""
+
+    def __init__(self, path, flush_interval=1.0, max_pending=1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._inflight = {}  # batch currently being written, still visible to load()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._writer = connect(path)
+        self._readers = threading.local()
+        self.stats = {'saves': 0, 'coalesced': 0, 'flushes': 0, 'rows_written': 0}
+        self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+        self._thread.start()
+
+    def save(self, student_id, progress):
+        """Queue a student's latest progress; replaces any not-yet-written save for them."""
+        record = dict(progress, updatedAt=time.time())
+        with self._lock:
+            self.stats['saves'] += 1
+            if student_id in self._pending:
+                self.stats['coalesced'] += 1
+            self._pending[student_id] = record
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def load(self, student_id):
+        """Latest progress for a student (including unflushed saves), or None."""
+        with self._lock:
+            record = self._pending.get(student_id) or self._inflight.get(student_id)
+        if record is not None:
+            return {key: value for key, value in record.items() if key != 'updatedAt'}
+        row = self._reader().execute(
+            'SELECT name, lesson_index, code, language, completed_lessons FROM progress WHERE student_id = ?',
+            (student_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        name, lesson_index, code, language, completed = row
+        return {
+            'name': name,
+            'lessonIndex': lesson_index,
+            'code': code,
+            'language': language,
+            'completedLessons': json.loads(completed),
+        }
+
+    def flush(self):
+        """Write all pending saves in one transaction. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            rows = [
+                {
+                    'student_id': student_id,
+                    'name': record['name'],
+                    'lesson_index': record['lessonIndex'],
+                    'code': record['code'],
+                    'language': record['language'],
+                    'completed_lessons': json.dumps(record['completedLessons']),
+                    'updated_at': record['updatedAt'],
+                }
+                for student_id, record in batch.items()
+            ]
+            try:
+                with self._writer:
+                    self._writer.executemany(UPSERT, rows)
+            except sqlite3.Error:
+                # Put the batch back (unless the student saved again since) so it is retried
+                with self._lock:
+                    for student_id, record in batch.items():
+                        self._pending.setdefault(student_id, record)
+                    self._inflight = {}
+                raise
+            with self._lock:
+                self._inflight = {}
+                self.stats['flushes'] += 1
+                self.stats['rows_written'] += len(rows)
+            return len(rows)
+
+    def close(self):
+        """Stop the flush thread and write anything still pending."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._writer.close()
+
+    def _reader(self):
+        # One read connection per request thread; WAL lets them read while a batch is written
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = connect(self.path)
+        return conn
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️  Could not save progress: {e}")
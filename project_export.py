@@ -0,0 +1,149 @@
+"""
+Server-side "Download all my files" export, used by the /api/export
+endpoint (app.py).
+
+The certificate page can build the ZIP in the browser with JSZip, which
+means downloading the library and holding the whole archive in page
+memory. Instead the server can build it with zipfile and write each
+compressed chunk straight to the socket as it is produced, so neither
+side ever holds the whole archive and the browser saves the download
+directly to disk.
+
+The archive has the same files as the JSZip version: one
+<lesson-id>.html per lesson, with the student's code (or the lesson's
+starting template) wrapped in a full HTML document.
+"""
+
+import json
+import re
+import types
+import zipfile
+
+from state_codec import decode_state
+
+# Same check as wrapInDoc in index.html: code that is already a full document is kept as is
+FULL_DOCUMENT = re.compile(r'^\s*(?:<!DOCTYPE|<html[\s>])', re.IGNORECASE)
+
+DOCUMENT_TEMPLATE = (
+    '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="UTF-8">\n'
+    '<meta name="viewport" content="width=device-width, initial-scale=1.0">\n'
+    '<title>{title}</title>\n</head>\n<body>\n{body}\n</body>\n</html>'
+)
+
+
+def wrap_in_doc(raw_code, lesson_id):
+    """Python version of wrapInDoc in index.html."""
+    trimmed = (raw_code or '').strip()
+    if FULL_DOCUMENT.match(trimmed):
+        return raw_code or ''
+    return DOCUMENT_TEMPLATE.format(title=lesson_id, body=trimmed)
+
+
+def export_filename(name):
+    """Download name, as in the app: html-css-accessibility-lessons-<name>.zip"""
+    return 'html-css-accessibility-lessons-' + re.sub(r'[^a-z0-9]', '-', name or '', flags=re.IGNORECASE) + '.zip'
+
+
+def state_from_hash(hash_value, lesson_ids):
+    """Export state from a progress URL hash. Only the current lesson's code is in a hash."""
+    state = decode_state(hash_value)
+    if not isinstance(state, dict):
+        raise ValueError('could not decode hash')
+    return state_from_progress(state, lesson_ids)
+
+
+def state_from_progress(progress, lesson_ids):
+    """Export state from saved progress (progress API or a decoded hash)."""
+    code_by_lesson = {}
+    lesson_index = progress.get('lessonIndex')
+    if isinstance(lesson_index, int) and 0 <= lesson_index < len(lesson_ids) and progress.get('code'):
+        code_by_lesson[lesson_ids[lesson_index]] = progress['code']
+    return validate_export_state({
+        'name': progress.get('name') or '',
+        'language': progress.get('language') or 'en',
+        'codeByLesson': code_by_lesson,
+    })
+
+
+def validate_export_state(data):
+    """Check an export request from the app ({name, language, codeByLesson}). Raises ValueError if malformed."""
+    if not isinstance(data, dict):
+        raise ValueError('export state must be a JSON object')
+    name = data.get('name', '')
+    language = data.get('language', 'en')
+    code_by_lesson = data.get('codeByLesson', {})
+    if not isinstance(name, str) or not isinstance(language, str):
+        raise ValueError('name and language must be strings')
+    if not isinstance(code_by_lesson, dict) or not all(isinstance(code, str) for code in code_by_lesson.values()):
+        raise ValueError('codeByLesson must map lesson ids to code')
+    return {'name': name, 'language': language, 'codeByLesson': code_by_lesson}
+
+
+def lesson_files(state, lesson_ids, translations):
+    """Yield (filename, html) for every lesson, like downloadAllFiles in index.html."""
+    lesson_texts = translations.get(state['language'], translations['en'])['lessons']
+    english_texts = translations['en']['lessons']
+    for lesson_id in lesson_ids:
+        raw = state['codeByLesson'].get(lesson_id)
+        if raw is None:
+            raw = lesson_texts.get(lesson_id, english_texts.get(lesson_id, {})).get('codeTemplate', '')
+        yield f'{lesson_id}.html', wrap_in_doc(raw, lesson_id)
+
+
+class StreamWriter:
+    """Minimal unseekable file object for zipfile that forwards writes to a socket file and counts bytes."""
+
+    def __init__(self, out):
+        self._out = out
+        self.bytes_written = 0
+
+    def write(self, data):
+        self._out.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        self._out.flush()
+
+
+def write_zip(files, out):
+    """
+    Write (filename, text) pairs as a ZIP to out, one compressed entry at a
+    time. out only needs write(); zipfile then uses data descriptors instead
+    of seeking back. Returns (bytes written, uncompressed size of the files).
+    """
+    writer = StreamWriter(out)
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, text in files:
+            archive.writestr(filename, text.encode('utf-8'))
+            writer.flush()
+        uncompressed = sum(info.file_size for info in archive.infolist())
+    return writer.bytes_written, uncompressed
+
+
+def iter_zip(files, sizes=None):
+    """
+    Yield the ZIP of (filename, text) pairs in chunks, one compressed entry
+    at a time, for a WSGI response body. If sizes is a dict it gets the
+    'compressed' and 'uncompressed' totals once the archive is complete.
+    """
+    chunks = []
+    writer = StreamWriter(types.SimpleNamespace(write=chunks.append, flush=lambda: None))
+    with zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, text in files:
+            archive.writestr(filename, text.encode('utf-8'))
+            yield b''.join(chunks)
+            chunks.clear()
+        uncompressed = sum(info.file_size for info in archive.infolist())
+    yield b''.join(chunks)  # central directory
+    if sizes is not None:
+        sizes.update(compressed=writer.bytes_written, uncompressed=uncompressed)
+
+
+def load_export_sources(translations_path='translations.json', validators_path='lesson-validators.json'):
+    """(lesson ids in course order, translations) needed to build exports."""
+    with open(validators_path, 'r') as f:
+        lesson_ids = list(json.load(f)['lessons'])
+    with open(translations_path, 'r') as f:
+        translations = json.load(f)
+    return lesson_ids, translations
@@ -1,51 +1,652 @@
 #!/usr/bin/env python3
 """
 Simple HTTP server for local development.
-Serves the learn-html-css application.
+Serves the learn-html-css application. The site itself (files, headers
+and APIs) is the WSGI application in app.py; this script adds the
+connection handling and can be swapped for any WSGI server.
 
 Usage:
-    python3 server.py [port]
+    python3 server.py [port] [--progress-db PATH] [--short-links PATH] [--classroom] [--zip-export] [--metrics]
+                      [--access-log PATH] [--profile RATE [--profile-dir DIR]]
+                      [--engine {threaded,asyncio}] [--keepalive-timeout SECONDS]
+                      [--max-requests-per-connection N] [--workers N]
+                      [--read-timeout SECONDS] [--write-timeout SECONDS]
+                      [--max-connections N] [--accept-queue N] [--early-hints] [--fingerprint] [--dev]
 
 Default port: 8000
+
+Options:
+    --progress-db PATH   Enable the /api/progress endpoint, saving student
+                         progress to this SQLite database
+    --short-links PATH   Enable /s/<id> short links for progress and
+                         certificate URLs, stored in this SQLite database
+    --classroom          Enable the live classroom dashboard (dashboard.html):
+                         students' apps report their lesson, and the
+                         dashboard receives class snapshots over
+                         Server-Sent Events
+    --zip-export         Build the "Download all my files" ZIP on the server
+                         (/api/export), streamed to the browser instead of
+                         built in the page with JSZip
+    --metrics            Serve request counts, latency histograms, bytes sent,
+                         cache and compression stats and open connections at
+                         /metrics (Prometheus text format), and collect
+                         startup timings from students' browsers at
+                         /api/timings
+    --access-log PATH    Write a JSON-lines access log to PATH from a
+                         background thread (instead of a line on stderr
+                         per request), rotated at 10 MB
+    --profile RATE       Run this fraction of requests (e.g. 0.05) under
+                         cProfile, merged per route. GET /api/profile or
+                         SIGUSR1 writes the stats to --profile-dir
+                         (default: profiles) with a top-N summary
+    --engine asyncio     Serve static files from an asyncio event loop with
+                         sendfile and HTTP/1.1 keep-alive; other requests
+                         are handled as usual on their own thread
+    --keepalive-timeout SECONDS
+                         Close HTTP/1.1 connections after this many idle
+                         seconds (default: 15)
+    --max-requests-per-connection N
+                         Close a connection after it has served N requests
+                         (default: 100)
+    --read-timeout SECONDS
+                         Close a connection when reading its request stalls
+                         for this long (default: 30)
+    --write-timeout SECONDS
+                         Close a connection when sending the response stalls
+                         for this long (default: 30)
+    --max-connections N  Handle at most N connections at once (threaded
+                         engine; default: 256, 0 for no limit)
+    --accept-queue N     Connections that wait for a free slot beyond
+                         --max-connections; when full, new connections get
+                         503 with Retry-After (default: 128)
+    --early-hints        Send 103 Early Hints before index.html with the same
+                         Link: rel=preload headers as the page (browsers act
+                         on them over HTTP/2, e.g. behind a reverse proxy)
+    --fingerprint        Serve index.html referring to content-hashed copies
+                         of its files (assets/styles.<hash>.css and so on),
+                         which browsers may cache for a year
+    --dev                Lesson authoring: watch index.html, styles.css and
+                         the JSON files, rebuild what depends on a changed
+                         file and reload open pages (files are revalidated
+                         with ETags instead of always downloaded again)
+    --workers N          Serve from N processes sharing the port
+                         (SO_REUSEPORT), to use more than one core. Worker
+                         processes that crash are restarted
+
+Reload without dropping connections (e.g. after editing lessons):
+    kill -USR2 <pid>     Start a new server on the same listening socket,
+                         then finish in-flight requests and exit
 """
 
+import argparse
+import dataclasses
 import http.server
+import signal
+import socket
 import socketserver
 import sys
 import os
+import threading
+import time
+import urllib.parse
+
+from admission import AdmissionQueue, Shedder
+from app import MAX_BODY_BYTES, RESPONSE_HEADERS, APP_PAGES, DEV_SOURCE_FILES, AppConfig, create_app, is_dynamic, prepare_site
+from graceful_reload import DRAIN_TIMEOUT, inherited_socket, notify_ready, start_successor
+from metrics import CountingWriter
+
+parser = argparse.ArgumentParser(description='Serve the learn-html-css application.')
+parser.add_argument('port', nargs='?', type=int, default=8000, help='port to listen on (default: 8000)')
+parser.add_argument('--progress-db', metavar='PATH',
+                    help='enable the /api/progress endpoint, saving progress to this SQLite database')
+parser.add_argument('--short-links', metavar='PATH',
+                    help='enable /s/<id> short links, stored in this SQLite database')
+parser.add_argument('--classroom', action='store_true',
+                    help='enable the live classroom dashboard (dashboard.html)')
+parser.add_argument('--zip-export', action='store_true',
+                    help='build the "Download all my files" ZIP on the server (/api/export)')
+parser.add_argument('--metrics', action='store_true',
+                    help='serve request metrics at /metrics (Prometheus text format)')
+parser.add_argument('--access-log', metavar='PATH',
+                    help='write a JSON-lines access log to this file from a background thread')
+parser.add_argument('--profile', metavar='RATE', type=float,
+                    help='profile this fraction of requests (0-1) under cProfile, merged per route')
+parser.add_argument('--profile-dir', metavar='DIR', default='profiles',
+                    help='where profile dumps are written (default: profiles)')
+parser.add_argument('--engine', choices=['threaded', 'asyncio'], default='threaded',
+                    help='threaded (default) or asyncio (sendfile and keep-alive for static files)')
+parser.add_argument('--keepalive-timeout', metavar='SECONDS', type=float, default=15,
+                    help='close idle HTTP/1.1 connections after this many seconds (default: 15)')
+parser.add_argument('--max-requests-per-connection', metavar='N', type=int, default=100,
+                    help='close a connection after it has served this many requests (default: 100)')
+parser.add_argument('--read-timeout', metavar='SECONDS', type=float, default=30,
+                    help='close a connection when reading its request stalls this long (default: 30)')
+parser.add_argument('--write-timeout', metavar='SECONDS', type=float, default=30,
+                    help='close a connection when sending the response stalls this long (default: 30)')
+parser.add_argument('--max-connections', metavar='N', type=int, default=256,
+                    help='connections handled at once by the threaded engine (default: 256, 0 for no limit)')
+parser.add_argument('--accept-queue', metavar='N', type=int, default=128,
+                    help='connections waiting for a free slot before new ones get 503 (default: 128)')
+parser.add_argument('--early-hints', action='store_true',
+                    help='send 103 Early Hints with the preload links before index.html')
+parser.add_argument('--fingerprint', action='store_true',
+                    help='serve index.html with content-hashed copies of its files, cached for a year')
+parser.add_argument('--dev', action='store_true',
+                    help='lesson authoring: rebuild and reload open pages when index.html, styles.css or the JSON files change')
+parser.add_argument('--workers', metavar='N', type=int, default=1,
+                    help='serve from N processes sharing the port with SO_REUSEPORT (default: 1)')
+
+# Seconds a client shed with 503 is asked to wait before retrying
+RETRY_AFTER_SECONDS = 5
+
+# Canned answer for connections shed while the accept queue is full
+SHED_BODY = b'The server is busy. Please retry in a few seconds.\n'
+SHED_RESPONSE = '\r\n'.join([
+    'HTTP/1.1 503 Service Unavailable',
+    f'Retry-After: {RETRY_AFTER_SECONDS}',
+    'Content-Type: text/plain; charset=utf-8',
+    f'Content-Length: {len(SHED_BODY)}',
+    'Connection: close',
+    *(f'{name}: {value}' for name, value in RESPONSE_HEADERS),
+    '', '',
+]).encode('latin-1') + SHED_BODY
+
+# Connections being handled, so a reload (kill -USR2) can close the idle ones and wait for the rest
+open_handlers = set()
+open_handlers_lock = threading.Lock()
+reload_lock = threading.Lock()
+
 
-# Get port from command line or use default
-PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+class BodyReader:
+    """wsgi.input for a request handed to the app: remembers how much of the body was left unread."""
 
-# Change to script directory
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self.remaining = int(length) if length.isdigit() else -1  # -1: unknown, the connection cannot be reused
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self._rfile.read(size)
+        self.remaining -= len(data)
+        return data
 
 # Set up handler
 Handler = http.server.SimpleHTTPRequestHandler
 
 # Enable CORS for development
 class CORSRequestHandler(Handler):
+    """Connection handling for the threaded engine; every request is answered by app.handle()."""
+
+    # Persistent connections: the page's files load over a few reused connections instead of
+    # one each. The socket timeout is the idle timeout between requests, then --read-timeout while
+    # a request arrives and --write-timeout while the response is sent
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY a reused connection waits on delayed ACKs
+    disable_nagle_algorithm = True
+
+    # Set by configure() before serving
+    app = None
+    options = None  # the parsed command line
+    admission = None
+    early_hints = False  # --early-hints: send a 103 before index.html
+
+    @classmethod
+    def configure(cls, app, options, admission=None):
+        cls.app = app
+        cls.options = options
+        cls.admission = admission
+        cls.early_hints = options.early_hints
+        cls.timeout = options.keepalive_timeout
+
     def end_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        # Keep-alive connections give up their slot when others are waiting for one
+        if self.app.draining.is_set() or (self.admission is not None and self.admission.depth):
+            self.close_connection = True
+        for name, value in self.app.response_headers(getattr(self, 'path', ''), self.response_status):
+            self.send_header(name, value)
+        if not self.connection_header_sent and not self.close_connection:
+            if self.request_version == 'HTTP/1.0':
+                self.send_header('Connection', 'keep-alive')  # only reached when the client asked for it
+            remaining = self.options.max_requests_per_connection - self.requests_served
+            self.send_header('Keep-Alive', f'timeout={self.options.keepalive_timeout:g}, max={remaining}')
+        elif not self.connection_header_sent and self.request_version == 'HTTP/1.1':
+            self.send_header('Connection', 'close')
         super().end_headers()
 
-# Start server
-with socketserver.TCPServer(("", PORT), CORSRequestHandler) as httpd:
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+        self.waiting_for_request = True
+        self.closing = False
+        self.connection_header_sent = False
+        with open_handlers_lock:
+            open_handlers.add(self)
+        if self.app.metrics is not None or self.app.access_log is not None:
+            self.wfile = CountingWriter(self.wfile)
+        if self.app.metrics is not None:
+            self.app.metrics.inc('http_connections_total')
+            self.app.metrics.inc('http_active_connections')
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            with open_handlers_lock:
+                open_handlers.discard(self)
+            if self.app.metrics is not None:
+                self.app.metrics.inc('http_active_connections', value=-1)
+                self.app.metrics.observe('http_requests_per_connection', (), self.requests_served)
+
+    def parse_request(self):
+        # The request line has arrived: time and profile from here, not from when the connection went idle
+        self.waiting_for_request = False
+        self.connection.settimeout(self.options.read_timeout)
+        self.request_start = time.perf_counter()
+        self.requests_served += 1
+        if self.requests_served > 1 and self.app.metrics is not None:
+            self.app.metrics.inc('http_keepalive_reuses_total')
+        if not super().parse_request():
+            return False
+        self.profile = self.app.start_profile(self.path)
+        if self.requests_served >= self.options.max_requests_per_connection:
+            self.close_connection = True
+        return True
+
+    def handle_one_request(self):
+        app = self.app
+        self.waiting_for_request = True
+        if self.requests_served:
+            self.connection.settimeout(self.timeout)
+        if app.metrics is None and app.access_log is None and app.profiler is None:
+            super().handle_one_request()
+            return
+        self.response_status = None
+        self.profile = None
+        self.request_start = time.perf_counter()
+        if isinstance(self.wfile, CountingWriter):
+            self.wfile.bytes_written = 0
+        route = None
+        try:
+            super().handle_one_request()
+            duration = time.perf_counter() - self.request_start
+            if self.response_status is not None:
+                route = app.route_label(self.path)
+        finally:
+            if self.profile is not None:
+                app.profiler.finish(self.profile, route)
+        if route is None:
+            return  # connection closed without a request
+        app.record_request(route, self.command, self.response_status, getattr(self.wfile, 'bytes_written', 0), duration,
+                           self.client_address[0], getattr(self, 'path', None),
+                           getattr(self, 'headers', None) and self.headers.get('User-Agent'))
+
+    def log_request(self, code='-', size='-'):
+        # With --access-log, requests are logged by handle_one_request instead
+        if self.app.access_log is None:
+            super().log_request(code, size)
+
+    def log_error(self, format, *args):
+        if self.waiting_for_request and format.startswith('Request timed out'):
+            return  # an idle keep-alive connection reached the timeout, which is not an error
+        if self.app.access_log is None:
+            super().log_error(format, *args)
+            return
+        self.app.access_log.log({'time': time.time(), 'client': self.client_address[0], 'error': format % args})
+
+    def send_response_only(self, code, message=None):
+        self.response_status = code
+        self.connection_header_sent = False
+        self.connection.settimeout(self.options.write_timeout)
+        super().send_response_only(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self.connection_header_sent = True
+        super().send_header(keyword, value)
+
+    def close_if_idle(self):
+        """Close a kept-alive connection that is waiting for its next request. Returns True if it was idle."""
+        # A new connection that has not sent its first request yet is left to be answered
+        if not (self.waiting_for_request and self.requests_served) or self.closing:
+            return False
+        self.closing = True
+        try:
+            self.connection.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+        return True
+
+    def do_GET(self):
+        # Interim response: the browser starts the preloads before index.html arrives (not for HTTP/1.0 clients)
+        link = self.early_hints and self.app.early_hints(urllib.parse.urlsplit(self.path).path)
+        if link and self.request_version == 'HTTP/1.1':
+            self.wfile.write(f'HTTP/1.1 103 Early Hints\r\nLink: {link}\r\n\r\n'.encode('latin-1'))
+        self.run_app()
+
+    def do_HEAD(self):
+        self.run_app()
+
+    def do_POST(self):
+        self.run_app()
+
+    def run_app(self):
+        """Answer the request with app.handle(): static files (with Range and ETags) as well as the APIs."""
+        environ = self.wsgi_environ()
+        status, headers, body = self.app.handle(environ)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        # A body left unread is still in the way of the next request; a body without a length
+        # (event stream, ZIP export) is ended by closing the connection
+        if environ['wsgi.input'].remaining or not (isinstance(body, bytes) or
+                                                   any(name.lower() == 'content-length' for name, _ in headers)):
+            self.close_connection = True
+        self.end_headers()
+        if isinstance(body, bytes):
+            if self.command != 'HEAD':
+                self.wfile.write(body)
+            return
+        try:
+            for chunk in body:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            body.close()
+
+    def wsgi_environ(self):
+        path, _, query = self.path.partition('?')
+        environ = {
+            'REQUEST_METHOD': self.command,
+            'PATH_INFO': urllib.parse.unquote(path, 'latin-1'),
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': self.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': self.headers.get('Content-Length', ''),
+            'REMOTE_ADDR': self.client_address[0],
+            'SERVER_PROTOCOL': self.request_version,
+            'wsgi.input': BodyReader(self.rfile, self.headers.get('Content-Length') or '0'),
+        }
+        for name, value in self.headers.items():
+            environ.setdefault('HTTP_' + name.upper().replace('-', '_'), value)
+        return environ
+
+
+def print_banner(args, app, admission, worker):
+    if worker not in (None, 0):
+        return  # worker 0 prints it for all of them
+    port = args.port
     print("=" * 80)
     print("✅ Server running!")
     print("=" * 80)
-    print(f"\n📂 Serving from: {os.getcwd()}")
-    print(f"🌐 URL: http://localhost:{PORT}")
-    print(f"\n👉 Open this URL in your browser: http://localhost:{PORT}")
+    print(f"\n📂 Serving from: {app.directory}")
+    print(f"🌐 URL: http://localhost:{port}")
+    if args.engine == 'asyncio':
+        print("⚡ Engine: asyncio (sendfile + keep-alive for static files)")
+    if admission is not None:
+        print(f"🚦 Up to {admission.max_active} connections at once, {admission.max_queued} more queued, then 503")
+    if worker is not None:
+        print(f"👷 Workers: {args.workers} processes sharing port {port} (supervisor pid {os.getppid()})")
+    print(f"🔁 Keep-alive: {args.keepalive_timeout:g}s idle timeout, {args.max_requests_per_connection} requests per connection")
+    if app.progress_store is not None:
+        print(f"💾 Saving progress to: {app.progress_store.path}")
+    if app.short_links is not None:
+        print(f"🔗 Short links stored in: {app.short_links.path}")
+    if app.export_sources is not None:
+        print("📦 Server-side ZIP export enabled")
+    if app.metrics is not None:
+        print(f"📈 Metrics: http://localhost:{port}/metrics")
+    if app.access_log is not None:
+        print(f"📝 Access log: {app.access_log.path}" + (" (one file per worker)" if worker is not None else ""))
+    if app.profiler is not None:
+        print(f"🔬 Profiling {app.profiler.rate:.0%} of requests: http://localhost:{port}/api/profile (or kill -USR1 {os.getpid() if worker is None else os.getppid()})")
+    if app.live_reload is not None:
+        print(f"👀 Dev mode: open pages reload when {', '.join(DEV_SOURCE_FILES)} change")
+    if app.classroom is not None:
+        print(f"🧑‍🏫 Classroom dashboard: http://localhost:{port}/dashboard.html")
+    if worker is None and hasattr(signal, 'SIGUSR2'):
+        print(f"🔄 Reload without dropping connections: kill -USR2 {os.getpid()}")
+    print(f"\n👉 Open this URL in your browser: http://localhost:{port}")
     print("\n💡 Press Ctrl+C to stop the server")
     print("=" * 80)
     print()
-    
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\n\n✋ Server stopped.")
+
+
+def close_stores(app, admission):
+    if admission is not None and admission.stats['shed']:
+        print(f"\n🚦 {admission.stats['shed']:,} connections were shed with 503 (peak queue {admission.stats['peak_depth']})")
+    app.close()
+    if app.access_log is not None:
+        if app.access_log.stats['dropped']:
+            print(f"\n⚠️  Access log dropped {app.access_log.stats['dropped']:,} records (writer fell behind)")
+
+
+def drain_connections(admission, timeout=DRAIN_TIMEOUT):
+    """After a reload: close idle keep-alive connections and wait for in-flight requests. False on timeout."""
+    # Connections accepted just before the server stopped only register once their thread starts
+    time.sleep(0.1)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with open_handlers_lock:
+            handlers = list(open_handlers)
+        if not handlers and not (admission is not None and admission.depth):
+            return True
+        for handler in handlers:
+            handler.close_if_idle()
+        time.sleep(0.05)
+    return False
+
+
+def finish_reload(app, admission, drained):
+    close_stores(app, admission)
+    if not drained:
+        print(f"⚠️  Connections still open after {DRAIN_TIMEOUT}s were closed")
+    print(f"👋 Old server (pid {os.getpid()}) finished its requests and stopped.")
+    sys.exit(0)
+
+
+def reload_server(listen_socket, command, draining, stop):
+    """Start a new server on the listening socket, then stop accepting and drain (kill -USR2)."""
+    if not reload_lock.acquire(blocking=False):
+        return  # already reloading
+    print("🔄 Reloading: starting a new server on the same socket...")
+    successor = start_successor(listen_socket, command)
+    if successor is None:
+        print("⚠️  The new server failed to start; still serving")
+        reload_lock.release()
+        return
+    print(f"🔄 New server running (pid {successor.pid}); finishing in-flight requests")
+    draining.set()
+    stop()
+
+
+def handle_reload_signal(listen_socket, command, draining, stop):
+    if hasattr(signal, 'SIGUSR2'):
+        # Run from a thread: starting the new server takes a while, and the signal arrives on the serving thread
+        signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+            target=reload_server, args=(listen_socket, command, draining, stop), daemon=True).start())
+
+
+def close_idle_connection():
+    """Free a slot for a queued connection by closing one idle keep-alive connection."""
+    with open_handlers_lock:
+        handlers = list(open_handlers)
+    for handler in handlers:
+        if handler.close_if_idle():
+            return
+
+
+# Each connection gets its own thread, so open dashboard event streams do not block other requests
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, admission=None, reuse_port=False, bind_and_activate=True):
+        self.admission = admission
+        self.shedder = Shedder(SHED_RESPONSE) if admission is not None else None
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        if self.admission is None:
+            super().process_request(request, client_address)
+            return
+        decision = self.admission.admit((request, client_address))
+        if decision == 'run':
+            super().process_request(request, client_address)
+        elif decision == 'queued':
+            close_idle_connection()
+        else:
+            self.shedder.shed(request)
+
+    def process_request_thread(self, request, client_address):
+        # When a connection is done, its thread goes on with the oldest queued one
+        while request is not None:
+            super().process_request_thread(request, client_address)
+            queued = self.admission.release() if self.admission is not None else None
+            request, client_address = queued or (None, None)
+
+    def server_bind(self):
+        # With --workers, every worker binds the same port and the kernel spreads connections across them
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parser.parse_args(argv)
+    if args.workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        parser.error('--workers needs fork() and SO_REUSEPORT (Linux, macOS or BSD)')
+    if args.workers > 1 and args.classroom:
+        parser.error('--classroom keeps the class in memory, so it needs a single process (--workers 1)')
+    if args.workers > 1 and args.dev:
+        parser.error('--dev rebuilds the site from a single watcher, so it needs a single process (--workers 1)')
+
+    # Change to script directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    config = AppConfig(
+        directory=os.getcwd(),
+        progress_db=args.progress_db,
+        short_links=args.short_links,
+        classroom=args.classroom,
+        zip_export=args.zip_export,
+        metrics=args.metrics,
+        access_log=args.access_log,
+        profile=args.profile,
+        profile_dir=args.profile_dir,
+        fingerprint=args.fingerprint,
+        dev=args.dev,
+    )
+
+    # Rebuild the flat translation table, fingerprinted copies and service worker precache manifest
+    # so they match the files being served, and load the export templates
+    site = prepare_site(config)
+
+    # Optional worker processes: everything above is loaded once and shared, everything below runs in each worker
+    worker = None
+    if args.workers > 1:
+        from supervisor import Supervisor
+        worker = Supervisor(args.workers).run()
+
+    # The site: stores, metrics, access log and profiler are opened here, in each worker
+    app = create_app(dataclasses.replace(config, worker=worker), site)
+    metrics, profiler = app.metrics, app.profiler
+
+    if profiler is not None and hasattr(signal, 'SIGUSR1'):
+        def dump_profiles(signum, frame):
+            # Write from a thread: the signal can arrive while the main thread holds the profiler's lock
+            def dump():
+                files = profiler.dump()
+                print(f"📊 Profiles written: {', '.join(files)}")
+            threading.Thread(target=dump, daemon=True).start()
+        signal.signal(signal.SIGUSR1, dump_profiles)
+
+    # Optional limit on connections handled at once by the threaded engine, with a bounded queue behind it
+    admission = None
+    if args.max_connections and args.engine == 'threaded':
+        admission = AdmissionQueue(args.max_connections, args.accept_queue)
+        if metrics is not None:
+            metrics.add_collector(lambda: [
+                ('http_admission_queue_depth', (), admission.depth),
+                ('http_admission_queued_total', (), admission.stats['queued']),
+                ('http_admission_shed_total', (), admission.stats['shed']),
+            ])
+
+    CORSRequestHandler.configure(app, args, admission)
+
+    def started():
+        """Called once the server is accepting connections."""
+        print_banner(args, app, admission, worker)
+        notify_ready()
+
+    def stopped():
+        close_stores(app, admission)
+        if worker in (None, 0):
+            print("\n\n✋ Server stopped.")
         sys.exit(0)
 
+    # Listening socket handed over by the server this one replaces (kill -USR2), if any. Once a new
+    # server has taken it over, connections close after their current request, event streams end,
+    # and the process exits when they are done
+    listen_socket = inherited_socket()
+    successor_command = [os.path.abspath(__file__), *argv]
+
+    # Start server
+    if args.engine == 'asyncio':
+        import asyncio
+        from async_engine import AsyncEngine
+
+        def record_static_request(method, path, status, size, duration, client, user_agent):
+            route = app.route_label(path) if metrics is not None else None
+            app.record_request(route, method, status, size, duration, client, path, user_agent)
+
+        engine = AsyncEngine(CORSRequestHandler, app.directory, app.response_headers, is_dynamic,
+                             on_request=record_static_request if metrics or app.access_log else None,
+                             keepalive_timeout=args.keepalive_timeout,
+                             read_timeout=args.read_timeout, write_timeout=args.write_timeout,
+                             max_requests=args.max_requests_per_connection, max_body_bytes=MAX_BODY_BYTES,
+                             early_hints=app.early_hints if args.early_hints else None,
+                             aliases=dict.fromkeys(APP_PAGES, app.page))
+        if metrics is not None:
+            metrics.add_collector(lambda: [
+                ('async_active_connections', (), engine.stats['active_connections']),
+                ('async_connections_total', (), engine.stats['connections']),
+                ('async_keepalive_reuses_total', (), engine.stats['keepalive_reuses']),
+                ('async_sendfile_bytes_total', (), engine.stats['sendfile_bytes']),
+                ('async_bridged_requests_total', (), engine.stats['bridged']),
+            ])
+        if listen_socket is None:
+            listen_socket = socket.create_server(('', args.port), reuse_port=worker is not None)
+        if worker is None:
+            handle_reload_signal(listen_socket, successor_command, app.draining, engine.stop)
+        try:
+            drained = asyncio.run(engine.serve_forever(listen_socket, ready=started, drain_timeout=DRAIN_TIMEOUT))
+        except KeyboardInterrupt:
+            stopped()
+        finish_reload(app, admission, drained)
+    else:
+        with ThreadingServer(("", args.port), CORSRequestHandler, admission, reuse_port=worker is not None,
+                             bind_and_activate=listen_socket is None) as httpd:
+            if listen_socket is None:
+                listen_socket = httpd.socket
+            else:
+                httpd.socket.close()
+                httpd.socket = listen_socket
+            if worker is None:
+                handle_reload_signal(listen_socket, successor_command, app.draining, httpd.shutdown)
+            if admission is not None:
+                threading.Thread(target=admission.report, name='admission-report', daemon=True).start()
+            started()
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                stopped()
+        # serve_forever only returns after a reload handed the socket to a new server
+        finish_reload(app, admission, drain_connections(admission))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Short links for progress and certificate URLs, used by server.py's
+/api/short-links and /s/<id> routes.
+
+The state hashes made by encodeState / encodeCertificateState are long
+base64 strings that get cut off when pasted into chats and emails. A
+short link id is derived from the hash itself (content-addressed), so
+sharing the same certificate twice gives the same link and each state is
+stored once. Lookups go through an in-memory LRU cache in front of the
+SQLite store, so a link shared with a whole class is read from disk once.
+"""
+
+import base64
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS short_links (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+# Shortest id handed out; longer prefixes of the digest are used only on a collision
+MIN_ID_LENGTH = 8
+
+# Longest state hash accepted (a full progress hash with code is a few KB)
+MAX_STATE_LENGTH = 64 * 1024
+
+STATE_PATTERN = re.compile(r'^[A-Za-z0-9_=+/%-]+$')
+ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{%d,43}$' % MIN_ID_LENGTH)
+
+
+def validate_state(state):
+    """Check a URL hash from the app (without the leading '#'). Raises ValueError if malformed."""
+    if not isinstance(state, str) or not state:
+        raise ValueError('hash is required')
+    if len(state) > MAX_STATE_LENGTH:
+        raise ValueError('hash is too long')
+    if not STATE_PATTERN.match(state):
+        raise ValueError('hash must be base64url encoded')
+    return state
+
+
+def link_id(state, length=MIN_ID_LENGTH):
+    """Content-addressed id: a prefix of the base64url sha256 of the state."""
+    digest = hashlib.sha256(state.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')[:length]
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ShortLinkStore:
+    """Content-addressed short links stored in SQLite, with an LRU cache for lookups."""
+
+    def __init__(self, path, cache_size=1024):
+        self.path = path
+        self.cache = LRUCache(cache_size)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def create(self, state):
+        """Store a state (once) and return its short id."""
+        validate_state(state)
+        with self._lock:
+            for length in range(MIN_ID_LENGTH, 44):
+                short_id = link_id(state, length)
+                row = self._conn.execute('SELECT state FROM short_links WHERE id = ?', (short_id,)).fetchone()
+                if row is None:
+                    with self._conn:
+                        self._conn.execute(
+                            'INSERT INTO short_links (id, state, created_at) VALUES (?, ?, ?)',
+                            (short_id, state, time.time()),
+                        )
+                    break
+                if row[0] == state:
+                    break
+                # Another state already has this prefix: try a longer one
+        self.cache.put(short_id, state)
+        return short_id
+
+    def resolve(self, short_id):
+        """State for a short id, or None if unknown."""
+        state = self.cache.get(short_id)
+        if state is not None:
+            return state
+        if not ID_PATTERN.match(short_id):
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT state FROM short_links WHERE id = ?', (short_id,)).fetchone()
+        if row is None:
+            return None
+        self.cache.put(short_id, row[0])
+        return row[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,121 @@
+"""
+Python versions of the URL hash helpers in index.html (encodeState,
+encodeCertificateState and decodeState), used by verify_certificates.py.
+
+decode_state accepts everything the app's decodeState accepts:
+    • the current format: base64url JSON with short names (n, l, c, lang, cl)
+    • the old format with full property names (name, lessonIndex, ...)
+    • the oldest format: plain base64 of URI-encoded JSON (decodeURIComponent fallback)
+
+Like atob/btoa, the JSON is carried as Latin-1 text.
+"""
+
+import base64
+import binascii
+import json
+import re
+from urllib.parse import unquote_to_bytes, urlsplit
+
+SHORT_NAMES = {
+    'n': 'name',
+    'l': 'lessonIndex',
+    'c': 'code',
+    'lang': 'language',
+    'cl': 'completedLessons',
+}
+
+# encodeCertificateState leaves out the code
+CERTIFICATE_NAMES = {short: name for short, name in SHORT_NAMES.items() if short in ('n', 'lang', 'cl')}
+
+PERCENT_ESCAPES = re.compile(r'(?:%[0-9A-Fa-f]{2})+')
+
+
+def _atob(data):
+    # atob ignores whitespace and rejects anything outside the base64 alphabet
+    data = re.sub(r'[\t\n\f\r ]', '', data)
+    if len(data) % 4 == 0:
+        data = re.sub(r'==?$', '', data)
+    if len(data) % 4 == 1:
+        raise ValueError('invalid base64 length')
+    data += '=' * (-len(data) % 4)
+    return base64.b64decode(data, validate=True).decode('latin-1')
+
+
+def _btoa(text):
+    return base64.b64encode(text.encode('latin-1')).decode('ascii')
+
+
+def _json_parse(text):
+    # JSON.parse has no NaN/Infinity
+    def reject(name):
+        raise ValueError(f'invalid JSON constant {name}')
+    return json.loads(text, parse_constant=reject)
+
+
+def _json_stringify(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _decode_uri_component(text):
+    # Each run of %XX escapes must be valid UTF-8, everything else is kept as is
+    return PERCENT_ESCAPES.sub(lambda m: unquote_to_bytes(m.group(0)).decode('utf-8'), text)
+
+
+def _compress(state, names):
+    # JSON.stringify drops undefined properties
+    return {short: state[name] for short, name in names.items() if name in state}
+
+
+def _to_base64url(text):
+    return _btoa(text).replace('+', '-').replace('/', '_').rstrip('=')
+
+
+def encode_state(state):
+    """Same hash as encodeState in index.html ('' if it cannot be encoded)."""
+    try:
+        return _to_base64url(_json_stringify(_compress(state, SHORT_NAMES)))
+    except (UnicodeEncodeError, TypeError, ValueError):
+        return ''
+
+
+def encode_certificate_state(state):
+    """Same hash as encodeCertificateState in index.html (no code, for certificate URLs)."""
+    try:
+        return _to_base64url(_json_stringify(_compress(state, CERTIFICATE_NAMES)))
+    except (UnicodeEncodeError, TypeError, ValueError):
+        return ''
+
+
+def decode_state(hash_value):
+    """State dict for a URL hash (without '#'), or None if the app could not read it either."""
+    try:
+        compressed = _json_parse(_atob(hash_value.replace('-', '+').replace('_', '/')))
+        if compressed is None:
+            raise ValueError('null state')
+        if isinstance(compressed, dict) and 'name' in compressed:
+            # Old format - return as is
+            return compressed
+        fields = compressed if isinstance(compressed, dict) else {}
+        return {name: fields.get(short) for short, name in SHORT_NAMES.items()}
+    except (ValueError, binascii.Error):
+        # Try old format decoding as fallback
+        try:
+            return _json_parse(_decode_uri_component(_atob(hash_value)))
+        except (ValueError, binascii.Error):
+            return None
+
+
+def hash_from_url(url):
+    """The state hash from a full app URL, a '#hash' or a bare hash."""
+    url = url.strip()
+    if '#' in url:
+        return url.split('#', 1)[1]
+    return url
+
+
+def short_link_id(url):
+    """The id of a /s/<id> short link URL, or None."""
+    path = urlsplit(url.strip()).path
+    if '#' not in url and path.startswith('/s/'):
+        return path[len('/s/'):].rstrip('/')
+    return None
@@ -0,0 +1,111 @@
+"""
+Worker processes for server.py --workers N.
+
+One Python process only runs Python code on one core at a time, however
+many threads it has. In this mode server.py forks N workers after its
+startup work (rebuilding the translation table and precache manifest,
+loading the export templates), and every worker binds the same port
+with SO_REUSEPORT, so the kernel spreads new connections across them.
+The objects loaded before forking are moved out of the garbage
+collector's reach with gc.freeze(), so the workers keep sharing those
+memory pages instead of each copying them.
+
+The supervisor process serves nothing itself. It restarts a worker that
+exits unexpectedly, forwards SIGUSR1 (profile dumps) to the workers,
+and on Ctrl+C or SIGTERM lets every worker shut down cleanly. Graceful
+reload (SIGUSR2) needs a single process, since it hands over one
+listening socket.
+"""
+
+import gc
+import os
+import signal
+import sys
+import time
+
+# Seconds to wait before restarting a worker that exited, so a worker that fails at startup does not spin
+RESTART_DELAY = 1
+
+
+class Supervisor:
+    """Forks worker processes and keeps them running."""
+
+    def __init__(self, workers, restart_delay=RESTART_DELAY):
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.pids = {}  # pid -> worker index
+        self.restarts = 0
+        self.stopping = False
+
+    def run(self):
+        """Fork the workers and watch them. Returns the worker index in each worker; the supervisor exits when stopped."""
+        gc.freeze()
+        signal.signal(signal.SIGTERM, self._stop)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self._forward)
+        if hasattr(signal, 'SIGUSR2'):
+            signal.signal(signal.SIGUSR2, self._reload_unsupported)
+        print(f"👷 Starting {self.workers} workers (supervisor pid {os.getpid()})")
+        for index in range(self.workers):
+            if self._spawn(index) == 0:
+                return index
+        try:
+            while self.pids:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                index = self.pids.pop(pid, None)
+                if index is None or self.stopping:
+                    continue
+                print(f"💥 Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}, restarting")
+                self.restarts += 1
+                time.sleep(self.restart_delay)
+                if not self.stopping and self._spawn(index) == 0:
+                    return index
+        except KeyboardInterrupt:
+            # Ctrl+C reaches the workers too; wait for them to save and exit
+            self.stopping = True
+            while self.pids:
+                try:
+                    pid, _ = os.wait()
+                except ChildProcessError:
+                    break
+                self.pids.pop(pid, None)
+        sys.exit(0)
+
+    def _spawn(self, index):
+        """Fork one worker. Returns 0 in the worker and the worker's pid in the supervisor."""
+        # Output still buffered at the fork would be written again by the worker
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            for signum in ('SIGUSR1', 'SIGUSR2'):
+                if hasattr(signal, signum):
+                    signal.signal(getattr(signal, signum), signal.SIG_DFL)
+            self.pids.clear()
+            return 0
+        self.pids[pid] = index
+        return pid
+
+    def _stop(self, signum, frame):
+        # Interrupt the workers like Ctrl+C does, so they flush their stores before exiting
+        self.stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+
+    def _reload_unsupported(self, signum, frame):
+        # A reload hands one listening socket to the new server, but every worker has its own
+        print("⚠️  Reloading (SIGUSR2) needs a single process (--workers 1); restart the server instead")
+
+    def _forward(self, signum, frame):
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,100 @@
+// Service worker: offline app shell for the tutorial.
+// The app shell (index.html, styles.css, the translation and validator files and the CDN scripts) is served
+// cache-first. precache-manifest.json (written by embed_translations.py) lists each shell file
+// with a content hash; files are re-downloaded in the background only when their hash changes.
+
+const CACHE_NAME = 'learn-html-css-shell';
+const MANIFEST_URL = 'precache-manifest.json';
+
+// Manifest currently reflected in the cache
+async function getCachedManifest(cache) {
+    const response = await cache.match(MANIFEST_URL);
+    if (!response) return null;
+    try {
+        return await response.json();
+    } catch (e) {
+        return null;
+    }
+}
+
+// Fetch the latest manifest and refresh any shell file whose hash changed
+async function updateAppShell() {
+    let response;
+    try {
+        response = await fetch(MANIFEST_URL, { cache: 'no-store' });
+    } catch (e) {
+        return; // Offline: keep serving what we have
+    }
+    if (!response.ok) return;
+
+    const manifest = await response.clone().json();
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await getCachedManifest(cache);
+    const cachedHashes = new Map((cached?.files || []).map(entry => [entry.url, entry.hash]));
+
+    const changed = manifest.files.filter(entry => cachedHashes.get(entry.url) !== entry.hash);
+    await Promise.all(changed.map(entry =>
+        fetch(entry.url, { cache: 'no-store' }).then(fileResponse => {
+            if (fileResponse.ok) return cache.put(entry.url, fileResponse);
+        })
+    ));
+
+    // External scripts are versioned by URL, so only fetch ones we don't have yet
+    await Promise.all((manifest.external || []).map(async (url) => {
+        if (await cache.match(url)) return;
+        try {
+            const scriptResponse = await fetch(url, { mode: 'cors' });
+            if (scriptResponse.ok) await cache.put(url, scriptResponse);
+        } catch (e) {
+            // Will be cached on first use instead
+        }
+    }));
+
+    if (!cached || cached.version !== manifest.version) {
+        await cache.put(MANIFEST_URL, response);
+    }
+}
+
+// Map a request to its app shell cache key ('/' is index.html), or null if it isn't part of the shell
+function shellCacheKey(request) {
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return url.href.startsWith('https://unpkg.com/') ? url.href : null;
+    }
+    const path = url.pathname.replace(/^\//, '');
+    if (request.mode === 'navigate' && (path === '' || path === 'index.html')) return 'index.html';
+    // Fingerprinted copies (server.py --fingerprint) never change, so they are cached as they are
+    if (path.startsWith('assets/')) return path;
+    if (['styles.css', 'translations.json', 'translation-table.json', 'lesson-validators.json'].includes(path)) return path;
+    return null;
+}
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(updateAppShell().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('fetch', (event) => {
+    if (event.request.method !== 'GET') return;
+    const key = shellCacheKey(event.request);
+    if (!key) return;
+
+    // Check for changed files in the background on each page load
+    if (event.request.mode === 'navigate') {
+        event.waitUntil(updateAppShell());
+    }
+
+    event.respondWith((async () => {
+        const cache = await caches.open(CACHE_NAME);
+        const cached = await cache.match(key);
+        if (cached) return cached;
+        const response = await fetch(event.request);
+        if (response.ok) {
+            await cache.put(key, response.clone());
+        }
+        return response;
+    })());
+});
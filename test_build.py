@@ -0,0 +1,207 @@
+"""
+Tests for the build steps in embed_translations.py
+Tests the flat translation table, the service worker precache manifest
+and the fingerprinted assets
+"""
+
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+import embed_translations
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SOURCE_FILES = ['index.html', 'styles.css', 'translations.json', 'lesson-validators.json']
+
+
+class TestBuild:
+    """Test build outputs"""
+
+    @pytest.fixture
+    def build_dir(self, tmp_path, monkeypatch):
+        """Copy the source files into a temporary directory and build there"""
+        for name in SOURCE_FILES:
+            shutil.copy(os.path.join(PROJECT_DIR, name), tmp_path / name)
+        monkeypatch.chdir(tmp_path)
+        embed_translations.build_translation_table()
+        return tmp_path
+
+    def test_translation_table_flattens_keys(self):
+        """Test nested keys become dotted keys and placeholders are pre-split"""
+        table = embed_translations.flatten_translations({
+            'en': {
+                'ui': {'title': 'Title', 'greeting': 'Hi {name}, lesson {n}'},
+                'categories': {'css': 'CSS'},
+                'glossary': {'tag': 'A tag'},
+            },
+        })
+        assert table['en'] == {
+            'ui.title': 'Title',
+            'ui.greeting': ['Hi ', 'name', ', lesson ', 'n', ''],
+            'categories.css': 'CSS',
+        }
+
+    def test_translation_table_falls_back_to_english(self):
+        """Test keys missing from a language use the English string"""
+        table = embed_translations.flatten_translations({
+            'en': {'ui': {'title': 'Title', 'next': 'Next'}},
+            'fr': {'ui': {'title': 'Titre'}},
+        })
+        assert table['fr'] == {'ui.title': 'Titre', 'ui.next': 'Next'}
+
+    def test_translation_table_covers_all_ui_keys(self, build_dir):
+        """Test every language has every English key"""
+        with open(build_dir / embed_translations.TRANSLATION_TABLE) as f:
+            table = json.load(f)
+        assert set(table) == {embed_translations.SOURCE_HASH_KEY, 'en', 'fr'}
+        assert set(table['fr']) == set(table['en'])
+        assert 'ui.welcomeUser' in table['en']
+
+    def test_translation_table_records_its_source(self, build_dir):
+        """Test the table carries the hash of translations.json, which changes when it is edited"""
+        table = json.loads((build_dir / embed_translations.TRANSLATION_TABLE).read_text())
+        source = (build_dir / 'translations.json').read_bytes()
+        assert table[embed_translations.SOURCE_HASH_KEY] == embed_translations.source_hash(source)
+        assert embed_translations.source_hash(source + b' ') != embed_translations.source_hash(source)
+        # 32-bit FNV-1a test vectors, which sourceHash() in index.html also produces
+        assert embed_translations.source_hash(b'') == '811c9dc5'
+        assert embed_translations.source_hash(b'a') == 'e40c292c'
+
+    def test_standalone_embeds_translations(self, build_dir):
+        """Test the standalone build replaces the translations fetch"""
+        embed_translations.build_standalone()
+        with open(build_dir / 'index-standalone.html') as f:
+            html = f.read()
+        assert "fetch('translations.json')" not in html
+        assert 'const translationTable = ' in html
+        assert 'const translationsLoaded = true;' in html
+        assert "fetch('lesson-validators.json')" not in html
+        assert 'const lessonValidators = compileLessonValidators(' in html
+        assert 'const lessonValidatorsLoaded = Promise.resolve(true);' in html
+
+    def test_precache_manifest_lists_app_shell(self, build_dir):
+        """Test manifest contains every app shell file with its hash"""
+        manifest = embed_translations.build_precache_manifest()
+
+        urls = [entry['url'] for entry in manifest['files']]
+        assert urls == embed_translations.APP_SHELL_FILES
+        for entry in manifest['files']:
+            assert entry['hash'] == embed_translations.file_hash(entry['url'])
+            assert entry['size'] == os.path.getsize(entry['url'])
+
+        with open(build_dir / embed_translations.PRECACHE_MANIFEST) as f:
+            assert json.load(f) == manifest
+
+    def test_precache_manifest_includes_cdn_scripts(self, build_dir):
+        """Test external scripts are read from index.html"""
+        manifest = embed_translations.build_precache_manifest()
+        assert manifest['external']
+        assert all(url.startswith('https://') for url in manifest['external'])
+
+    def test_precache_manifest_lists_preloads(self, build_dir):
+        """Test preloads are what index.html loads at startup, without lazily loaded scripts"""
+        preload = embed_translations.build_precache_manifest()['preload']
+        urls = [entry['url'] for entry in preload]
+        assert urls[0] == 'styles.css'
+        assert {'translations.json', 'translation-table.json', 'lesson-validators.json'} <= set(urls)
+        assert not any('jszip' in url for url in urls)
+        scripts = {entry['url']: entry['crossorigin'] for entry in preload if entry['as'] == 'script'}
+        assert scripts['https://unpkg.com/react@18/umd/react.production.min.js'] is True
+        assert scripts['https://unpkg.com/@babel/standalone/babel.min.js'] is False
+
+    def test_precache_manifest_version_changes_with_content(self, build_dir):
+        """Test version changes only when a file changes"""
+        first = embed_translations.build_precache_manifest()
+        assert embed_translations.build_precache_manifest()['version'] == first['version']
+
+        with open(build_dir / 'styles.css', 'a') as f:
+            f.write('\n/* changed */\n')
+        second = embed_translations.build_precache_manifest()
+
+        assert second['version'] != first['version']
+        changed = [a['url'] for a, b in zip(first['files'], second['files']) if a['hash'] != b['hash']]
+        assert changed == ['styles.css']
+
+    def test_fingerprinted_assets_and_page(self, build_dir):
+        """Test hashed copies are written and index.html's references point at them"""
+        assets = embed_translations.build_fingerprinted_assets()
+        assert set(assets) == set(embed_translations.FINGERPRINTED_FILES)
+        for name, url in assets.items():
+            assert url == f"assets/{name.rsplit('.', 1)[0]}.{embed_translations.file_hash(name)}.{name.rsplit('.', 1)[1]}"
+            assert (build_dir / url).read_bytes() == (build_dir / name).read_bytes()
+        with open(build_dir / 'asset-manifest.json') as f:
+            assert json.load(f) == assets
+
+        page = (build_dir / 'index-fingerprinted.html').read_text()
+        assert f'<link rel="stylesheet" href="{assets["styles.css"]}">' in page
+        assert f"fetch('{assets['translations.json']}')" in page
+        assert "fetch('translations.json')" not in page
+        # Comments mentioning the files are left alone
+        assert '(lesson-validators.json)' in page
+
+        manifest = embed_translations.build_precache_manifest(assets=assets)
+        urls = [entry['url'] for entry in manifest['files']]
+        assert urls[0] == 'index.html'
+        assert manifest['files'][0]['hash'] == embed_translations.file_hash('index-fingerprinted.html')
+        assert assets['styles.css'] in urls and 'styles.css' not in urls
+        assert assets['translations.json'] in [entry['url'] for entry in manifest['preload']]
+
+    def test_fingerprinting_keeps_previous_build_only(self, build_dir):
+        """Test a rebuild keeps the previous copies and removes older ones"""
+        first = embed_translations.build_fingerprinted_assets()['styles.css']
+        for n in (1, 2):
+            with open(build_dir / 'styles.css', 'a') as f:
+                f.write(f'\n/* change {n} */\n')
+            second = embed_translations.build_fingerprinted_assets()['styles.css']
+        assert not (build_dir / first).exists()
+        assert (build_dir / second).exists()
+        assert len([name for name in os.listdir(build_dir / 'assets') if name.startswith('styles.')]) == 2
+
+    def test_build_in_another_directory(self, build_dir, tmp_path_factory, monkeypatch):
+        """Test the build steps read and write the directory they are given, not the current one"""
+        monkeypatch.chdir(tmp_path_factory.mktemp('elsewhere'))
+        assets = embed_translations.build_fingerprinted_assets(directory=str(build_dir))
+        manifest = embed_translations.build_precache_manifest(assets=assets, directory=str(build_dir))
+        embed_translations.build_standalone(directory=str(build_dir))
+        assert (build_dir / assets['styles.css']).exists()
+        assert json.loads((build_dir / 'precache-manifest.json').read_text()) == manifest
+        assert (build_dir / 'index-standalone.html').exists()
+        assert os.listdir('.') == []
+
+    def test_outputs_are_never_seen_half_written(self, build_dir):
+        """Test the page and manifests read while a rebuild runs are always complete"""
+        embed_translations.build_fingerprinted_assets()
+        embed_translations.build_precache_manifest()
+        stop = threading.Event()
+
+        def rebuild():
+            while not stop.is_set():
+                embed_translations.build_translation_table()
+                embed_translations.build_fingerprinted_assets()
+                embed_translations.build_precache_manifest()
+
+        thread = threading.Thread(target=rebuild)
+        thread.start()
+        try:
+            for _ in range(300):
+                for name in ('translation-table.json', 'asset-manifest.json', 'precache-manifest.json'):
+                    json.loads((build_dir / name).read_text())
+                assert (build_dir / 'index-fingerprinted.html').read_text().rstrip().endswith('</html>')
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_unchanged_outputs_are_not_rewritten(self, build_dir):
+        """Test a rebuild from the same sources leaves the outputs (and their ETags) untouched"""
+        embed_translations.build_fingerprinted_assets()
+        embed_translations.build_precache_manifest()
+        names = ['translation-table.json', 'index-fingerprinted.html', 'asset-manifest.json', 'precache-manifest.json']
+        before = [os.stat(build_dir / name).st_mtime_ns for name in names]
+        embed_translations.build_translation_table()
+        embed_translations.build_fingerprinted_assets()
+        embed_translations.build_precache_manifest()
+        assert [os.stat(build_dir / name).st_mtime_ns for name in names] == before
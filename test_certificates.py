@@ -0,0 +1,97 @@
+"""
+Tests for state_codec.py and verify_certificates.py
+Tests decoding every URL hash format the app accepts and bulk certificate verification
+"""
+
+import base64
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+
+from shortlinks import ShortLinkStore
+from state_codec import decode_state, encode_certificate_state, encode_state
+from verify_certificates import load_lesson_ids, verify_url
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STATE = {
+    'name': 'Zoé',
+    'lessonIndex': 3,
+    'code': '<p>Bonjour</p>',
+    'language': 'fr',
+    'completedLessons': list(range(20)),
+}
+
+
+class TestStateCodec:
+    """Test the Python port of encodeState/decodeState"""
+
+    def test_matches_browser_encoding(self):
+        """Test hashes are identical to the ones btoa makes in the browser"""
+        state = dict(STATE, code='<p>é</p>', completedLessons=[0, 1])
+        assert encode_state(state) == 'eyJuIjoiWm_pIiwibCI6MywiYyI6IjxwPuk8L3A-IiwibGFuZyI6ImZyIiwiY2wiOlswLDFdfQ'
+        assert decode_state(encode_state(state)) == state
+
+    def test_certificate_format(self):
+        """Test certificate hashes decode without code or lesson index"""
+        state = decode_state(encode_certificate_state(STATE))
+        assert state['name'] == 'Zoé'
+        assert state['completedLessons'] == list(range(20))
+        assert state['code'] is None
+
+    def test_legacy_formats(self):
+        """Test full property names and the decodeURIComponent fallback"""
+        full_names = base64.urlsafe_b64encode(json.dumps(STATE).encode('latin-1')).decode().rstrip('=')
+        assert decode_state(full_names) == STATE
+        # btoa(encodeURIComponent(JSON.stringify({name: 'Zoé', completedLessons: [1]})))
+        oldest = 'JTdCJTIybmFtZSUyMiUzQSUyMlpvJUMzJUE5JTIyJTJDJTIyY29tcGxldGVkTGVzc29ucyUyMiUzQSU1QjElNUQlN0Q='
+        assert decode_state(oldest) == {'name': 'Zoé', 'completedLessons': [1]}
+
+    def test_invalid_hashes(self):
+        """Test hashes the app cannot read decode to None"""
+        for bad in ('', '!!!', 'a', 'bnVsbA', 'bm90IGpzb24'):
+            assert decode_state(bad) is None
+
+
+class TestVerifyCertificates:
+    """Test bulk certificate verification"""
+
+    def test_verify_url(self, tmp_path):
+        """Test complete, incomplete, unreadable and short link certificates"""
+        lesson_ids = load_lesson_ids()
+        complete = encode_certificate_state(STATE)
+        partial = encode_certificate_state(dict(STATE, completedLessons=list(range(18))))
+
+        row = verify_url('http://localhost:8000/#' + complete, lesson_ids)
+        assert row['valid'] and row['completed'] == 20 and row['missing'] == ''
+        row = verify_url('#' + partial, lesson_ids)
+        assert not row['valid']
+        assert row['missing'] == 'accessibility-5 accessibility-6'
+        assert verify_url('http://localhost:8000/#garbage!', lesson_ids)['error'] == 'could not decode'
+
+        store = ShortLinkStore(str(tmp_path / 'links.db'))
+        try:
+            short_id = store.create(complete)
+            assert verify_url(f'http://localhost:8000/s/{short_id}', lesson_ids, store)['valid']
+            assert verify_url('http://localhost:8000/s/unknown-id', lesson_ids, store)['error'] == 'unknown short link'
+        finally:
+            store.close()
+
+    def test_cli_writes_csv_report(self):
+        """Test URLs from stdin produce one CSV row each"""
+        urls = [
+            'http://localhost:8000/#' + encode_certificate_state(STATE),
+            'http://localhost:8000/#' + encode_certificate_state(dict(STATE, name='')),
+        ]
+        proc = subprocess.run(
+            [sys.executable, os.path.join(PROJECT_DIR, 'verify_certificates.py'), '-'],
+            input='\n'.join(urls) + '\n\n', capture_output=True, text=True, timeout=30,
+        )
+        assert proc.returncode == 0
+        rows = list(csv.DictReader(io.StringIO(proc.stdout)))
+        assert [row['valid'] for row in rows] == ['True', 'False']
+        assert rows[1]['error'] == 'no name'
+        assert 'Valid certificates: 1 / 2' in proc.stderr
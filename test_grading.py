@@ -0,0 +1,128 @@
+"""
+Tests for grade_submissions.py
+Tests the shared lesson validator manifest and bulk grading from directories and JSONL
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from grade_submissions import CHUNK_SIZE, compile_rule, grade_all, load_validators
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(PROJECT_DIR, 'grade_submissions.py')
+
+
+def run_grader(*args, stdin=None):
+    """Run the grading CLI; returns (exit code, result lines, stderr)."""
+    proc = subprocess.run(
+        [sys.executable, SCRIPT, *args, '--workers', '2'],
+        input=stdin, capture_output=True, text=True, timeout=60,
+    )
+    results = [json.loads(line) for line in proc.stdout.splitlines()]
+    return proc.returncode, results, proc.stderr
+
+
+class TestValidators:
+    """Test the lesson validator manifest"""
+
+    def test_manifest_covers_every_lesson(self):
+        """Test lesson-validators.json has a rule for every lesson in index.html"""
+        with open(os.path.join(PROJECT_DIR, 'index.html'), 'r') as f:
+            lesson_ids = set(re.findall(r"^\s+id: '([a-z]+-\d+)',$", f.read(), re.MULTILINE))
+        assert len(lesson_ids) == 20
+        assert set(load_validators()) == lesson_ids
+
+    def test_rule_semantics(self):
+        """Test match/all/any/before rules behave like the browser validators"""
+        assert compile_rule({'match': '<h1>'})('<H1>Title</H1>')
+        both = compile_rule({'all': [{'match': '<h1'}, {'match': '<p'}]})
+        assert both('<h1>a</h1><p>b</p>') and not both('<h1>a</h1>')
+        either = compile_rule({'any': [{'match': '<ul'}, {'match': '<ol'}]})
+        assert either('<ol></ol>') and not either('<p></p>')
+        ordered = compile_rule({'before': ['<label', '<input']})
+        assert ordered('<label>Name</label><input>')
+        assert not ordered('<input><label>Name</label>')
+        assert not ordered('<input>')
+        with pytest.raises(ValueError):
+            compile_rule({'unknown': 1})
+
+    def test_lesson_validators(self):
+        """Test real lesson rules accept correct code and reject incomplete code"""
+        validators = load_validators()
+        assert validators['html-2']('<h1>Hi</h1>\n<p>Text</p>')
+        assert not validators['html-2']('<h1>Hi</h1>')
+        assert validators['css-1']('<style>p { color: red; }</style>')
+        assert not validators['css-1']('<p>no style</p>')
+
+
+class TestGradingCli:
+    """Test grading many submissions at once"""
+
+    def test_grade_directory(self, tmp_path):
+        """Test a folder per student with <lesson-id>.html files (as in the ZIP export)"""
+        for student, code in (('alice', '<h1>Hi</h1><p>Text</p>'), ('bob', '<h1>Hi</h1>')):
+            (tmp_path / student).mkdir()
+            (tmp_path / student / 'html-2.html').write_text(code)
+        (tmp_path / 'notes.html').write_text('<p>not a lesson</p>')
+
+        code, results, stderr = run_grader(str(tmp_path))
+        assert code == 0
+        assert results == [
+            {'student': 'alice', 'lesson': 'html-2', 'passed': True},
+            {'student': 'bob', 'lesson': 'html-2', 'passed': False},
+        ]
+        assert 'Skipping' in stderr
+        assert 'Graded 2 submissions' in stderr
+
+    def test_grade_jsonl_stdin(self):
+        """Test JSONL on stdin, including unknown lessons and --lesson"""
+        lines = [
+            {'student': 's1', 'lesson': 'css-1', 'code': '<style>p { color: red; }</style>'},
+            {'student': 's2', 'lesson': 'nope', 'code': ''},
+        ]
+        stdin = '\n'.join(json.dumps(line) for line in lines) + '\n'
+
+        _, results, _ = run_grader('-', stdin=stdin)
+        assert [r['passed'] for r in results] == [True, False]
+        assert results[1]['error'] == 'unknown lesson'
+
+        _, results, _ = run_grader('-', '--lesson', 'html-2', stdin=stdin)
+        assert [r['lesson'] for r in results] == ['html-2', 'html-2']
+        assert not any(r['passed'] for r in results)
+
+    def test_bad_records_become_error_rows(self):
+        """Test malformed JSONL records are reported as errors without stopping the run"""
+        stdin = '\n'.join([
+            '[1, 2]',
+            '{"lesson": "css-1", "code": 5}',
+            '{"lesson": ["css-1"], "code": ""}',
+            'not json',
+            json.dumps({'student': 'ok', 'lesson': 'css-1', 'code': '<style>p { color: red; }</style>'}),
+        ]) + '\n'
+
+        code, results, stderr = run_grader('-', stdin=stdin)
+        assert code == 0
+        assert [r.get('error', '').split(':')[0] for r in results] == [
+            'not a JSON object', 'code must be a string', 'lesson must be a string', 'invalid JSON', '']
+        assert [r['student'] for r in results[:4]] == ['line-1', 'line-2', 'line-3', 'line-4']
+        assert results[4] == {'student': 'ok', 'lesson': 'css-1', 'passed': True}
+        assert '3 records could not be graded' in stderr  # the bad code still counts under css-1
+
+    def test_results_stream_before_input_ends(self):
+        """Test the first result arrives while most of a long input stream is still unread"""
+        read = []
+
+        def submissions():
+            for n in range(CHUNK_SIZE * 20):
+                read.append(n)
+                yield {'student': f's{n}', 'lesson': 'html-2', 'code': '<h1>Hi</h1><p>Text</p>'}
+
+        results = grade_all(submissions(), workers=1)
+        assert next(results) == {'student': 's0', 'lesson': 'html-2', 'passed': True}
+        assert len(read) < CHUNK_SIZE * 20
+        assert [result['student'] for result in results] == [f's{n}' for n in range(1, CHUNK_SIZE * 20)]
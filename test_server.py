@@ -0,0 +1,1118 @@
+"""
+Tests for server.py and its optional APIs
+Tests the progress API, the batched SQLite progress store, short links,
+the live classroom dashboard, the server-side ZIP export, /metrics,
+client timings, the access log, the request profiler, the asyncio
+engine, HTTP/1.1 keep-alive, worker processes, graceful reload,
+admission control, preload headers, fingerprinted assets, the WSGI
+application, range requests and dev mode live reload
+"""
+
+import email
+import email.policy
+import http.client
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import wsgiref.util
+import wsgiref.validate
+import zipfile
+
+import pytest
+
+from access_log import AccessLog
+from admission import AdmissionQueue
+from app import AppConfig, create_app
+from byte_ranges import parse_range
+from client_timings import ClientTimings, validate_timings
+from classroom import ClassroomBroadcaster, validate_beacon
+from project_export import lesson_files, load_export_sources, wrap_in_doc, write_zip
+from live_reload import FileWatcher
+from metrics import Metrics
+from profiler import RequestProfiler
+from progress_store import ProgressStore, validate_progress
+from shortlinks import ShortLinkStore, link_id
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROGRESS = {
+    'name': 'Test User',
+    'lessonIndex': 3,
+    'code': '<p>Hello</p>',
+    'language': 'fr',
+    'completedLessons': [0, 1, 2],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(url, data=None, method=None):
+    """Return (status, parsed JSON body or raw bytes) for a request."""
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    req = urllib.request.Request(url, data=body, method=method)
+    if body is not None:
+        req.add_header('Content-Type', 'application/json')
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            status, payload, content_type = response.status, response.read(), response.headers.get('Content-Type', '')
+    except urllib.error.HTTPError as e:
+        status, payload, content_type = e.code, e.read(), e.headers.get('Content-Type', '')
+    if 'json' in content_type:
+        return status, json.loads(payload)
+    return status, payload
+
+
+@pytest.fixture
+def start_server(tmp_path):
+    """Start server.py on a free port with extra arguments; returns its base URL"""
+    procs = []
+
+    def start(*extra_args):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(PROJECT_DIR, 'server.py'), str(port), *extra_args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        procs.append(proc)
+        base = f'http://127.0.0.1:{port}'
+        for _ in range(50):
+            try:
+                # HEAD: urllib would take a 103 Early Hints (--early-hints) for the final response
+                urllib.request.urlopen(urllib.request.Request(base + '/index.html', method='HEAD'), timeout=1).read()
+                return base
+            except OSError:
+                time.sleep(0.1)
+        pytest.fail('server.py did not start')
+
+    yield start
+    for proc in procs:
+        proc.terminate()
+        proc.wait(timeout=5)
+
+
+class TestProgressStore:
+    """Test write coalescing and batched flushes"""
+
+    def test_saves_are_coalesced_per_student(self, tmp_path):
+        """Test repeated saves for one student become a single row write"""
+        store = ProgressStore(str(tmp_path / 'progress.db'), flush_interval=60)
+        try:
+            for i in range(50):
+                store.save('student-a1', dict(PROGRESS, code=f'<p>{i}</p>'))
+            store.save('student-b2', PROGRESS)
+
+            assert store.load('student-a1')['code'] == '<p>49</p>'
+            assert store.flush() == 2
+            assert store.stats['coalesced'] == 49
+            assert store.load('student-a1')['code'] == '<p>49</p>'
+        finally:
+            store.close()
+
+    def test_progress_survives_restart(self, tmp_path):
+        """Test pending saves are written on close and read back from SQLite"""
+        path = str(tmp_path / 'progress.db')
+        store = ProgressStore(path, flush_interval=60)
+        store.save('student-a1', PROGRESS)
+        store.close()
+
+        store = ProgressStore(path)
+        try:
+            assert store.load('student-a1') == PROGRESS
+            assert store.load('unknown-student') is None
+        finally:
+            store.close()
+
+    def test_late_flush_keeps_newer_progress(self, tmp_path):
+        """Test an older record flushed after a newer one (e.g. by another worker) does not replace it"""
+        path = str(tmp_path / 'progress.db')
+        stale, current = ProgressStore(path, flush_interval=60), ProgressStore(path, flush_interval=60)
+        try:
+            stale.save('student-a1', dict(PROGRESS, code='<p>old</p>'))
+            time.sleep(0.01)
+            current.save('student-a1', dict(PROGRESS, code='<p>new</p>'))
+            assert current.flush() == 1
+            stale.flush()
+            assert current.load('student-a1')['code'] == '<p>new</p>'
+        finally:
+            stale.close()
+            current.close()
+
+    def test_database_uses_wal(self, tmp_path):
+        """Test the database is in WAL mode"""
+        store = ProgressStore(str(tmp_path / 'progress.db'))
+        try:
+            mode = store._writer.execute('PRAGMA journal_mode').fetchone()[0]
+            assert mode == 'wal'
+        finally:
+            store.close()
+
+    def test_validate_progress_rejects_bad_payloads(self):
+        """Test malformed progress is rejected"""
+        assert validate_progress(PROGRESS) == PROGRESS
+        for bad in ([], {}, dict(PROGRESS, name=''), dict(PROGRESS, lessonIndex='3'),
+                    dict(PROGRESS, completedLessons=['a'])):
+            with pytest.raises(ValueError):
+                validate_progress(bad)
+
+
+class TestProgressApi:
+    """Test the /api/progress endpoint"""
+
+    def test_api_disabled_by_default(self, start_server):
+        """Test the API is off unless --progress-db is given"""
+        base = start_server()
+        status, _ = request(base + '/api/progress')
+        assert status == 404
+
+    def test_save_and_load_progress(self, start_server, tmp_path):
+        """Test progress posted by the app can be loaded back"""
+        base = start_server('--progress-db', str(tmp_path / 'progress.db'))
+
+        assert request(base + '/api/progress') == (200, {'enabled': True})
+        assert request(base + '/api/progress/student-a1')[0] == 404
+        assert request(base + '/api/progress/student-a1', PROGRESS) == (202, {'saved': True})
+        assert request(base + '/api/progress/student-a1') == (200, PROGRESS)
+
+    def test_invalid_requests(self, start_server, tmp_path):
+        """Test bad ids and payloads are rejected"""
+        base = start_server('--progress-db', str(tmp_path / 'progress.db'))
+
+        assert request(base + '/api/progress/bad%20id!')[0] == 404
+        status, payload = request(base + '/api/progress/student-a1', {'name': 'x'})
+        assert status == 400
+        assert 'lessonIndex' in payload['error']
+
+
+class TestShortLinks:
+    """Test content-addressed short links"""
+
+    STATE = 'eyJuIjoiVGVzdCBVc2VyIiwibGFuZyI6ImVuIiwiY2wiOlswLDEsMl19'
+
+    def test_same_state_gives_same_id(self, tmp_path):
+        """Test a state is stored once and always maps to the same id"""
+        store = ShortLinkStore(str(tmp_path / 'links.db'))
+        try:
+            short_id = store.create(self.STATE)
+            assert short_id == link_id(self.STATE)
+            assert store.create(self.STATE) == short_id
+            assert store._conn.execute('SELECT COUNT(*) FROM short_links').fetchone()[0] == 1
+        finally:
+            store.close()
+
+    def test_lookups_are_cached(self, tmp_path):
+        """Test repeated lookups are served from the LRU cache"""
+        path = str(tmp_path / 'links.db')
+        store = ShortLinkStore(path)
+        short_id = store.create(self.STATE)
+        store.close()
+
+        store = ShortLinkStore(path, cache_size=2)
+        try:
+            for _ in range(10):
+                assert store.resolve(short_id) == self.STATE
+            assert store.cache.misses == 1
+            assert store.cache.hits == 9
+            assert store.resolve('unknown-id') is None
+        finally:
+            store.close()
+
+    def test_rejects_invalid_state(self, tmp_path):
+        """Test non-base64 input is rejected"""
+        store = ShortLinkStore(str(tmp_path / 'links.db'))
+        try:
+            for bad in ('', None, 'not a hash!', 'a' * 100000):
+                with pytest.raises(ValueError):
+                    store.create(bad)
+        finally:
+            store.close()
+
+    def test_short_link_redirects(self, start_server, tmp_path):
+        """Test POST creates a link and GET /s/<id> redirects to the hash"""
+        base = start_server('--short-links', str(tmp_path / 'links.db'))
+
+        status, payload = request(base + '/api/short-links', {'hash': self.STATE})
+        assert status == 201
+        assert payload['path'] == f"/s/{payload['id']}"
+
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', payload['path'])
+        response = conn.getresponse()
+        assert response.status == 302
+        assert response.getheader('Location') == f'/#{self.STATE}'
+        conn.close()
+
+        assert request(base + '/s/unknown-id')[0] == 404
+
+
+class TestClassroom:
+    """Test the classroom broadcaster and its Server-Sent Events stream"""
+
+    BEACON = {'name': 'Test User', 'lessonIndex': 2, 'completedLessons': [0, 1]}
+
+    def test_beacons_are_coalesced_into_one_snapshot(self):
+        """Test many beacons between broadcasts give each dashboard one push"""
+        broadcaster = ClassroomBroadcaster(interval=60)
+        try:
+            subscriber = broadcaster.subscribe()
+            assert json.loads(subscriber.next(timeout=1))['students'] == []
+            assert broadcaster.clients == 1
+
+            for i in range(100):
+                broadcaster.update(f'student-{i:04d}', dict(self.BEACON, lessonIndex=i % 20))
+            assert broadcaster.broadcast()
+            assert not broadcaster.broadcast()  # nothing changed since
+
+            snapshot = json.loads(subscriber.next(timeout=1))
+            assert len(snapshot['students']) == 100
+            assert subscriber.next(timeout=0.1) is None
+            assert broadcaster.stats['beacons'] == 100
+            assert broadcaster.stats['broadcasts'] == 1
+            assert broadcaster.stats['last_latency_ms'] > 0
+
+            broadcaster.unsubscribe(subscriber)
+            assert broadcaster.clients == 0
+        finally:
+            broadcaster.close()
+
+    def test_validate_beacon(self):
+        """Test malformed beacons are rejected"""
+        assert validate_beacon(self.BEACON) == self.BEACON
+        for bad in ([], dict(self.BEACON, lessonIndex=-1), dict(self.BEACON, completedLessons='0')):
+            with pytest.raises(ValueError):
+                validate_beacon(bad)
+
+    def test_dashboard_event_stream(self, start_server):
+        """Test a beacon posted by the app reaches the dashboard's event stream"""
+        base = start_server('--classroom')
+        assert request(base + '/api/classroom')[1]['enabled']
+
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', '/api/classroom/events')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader('Content-Type') == 'text/event-stream'
+
+        def next_snapshot():
+            while True:
+                line = response.fp.readline().decode('utf-8')
+                if line.startswith('data: '):
+                    return json.loads(line[len('data: '):])
+
+        assert next_snapshot()['students'] == []
+        assert request(base + '/api/classroom/student-a1', self.BEACON)[0] == 204
+        students = next_snapshot()['students']
+        assert [(s['id'], s['name'], s['lessonIndex'], s['completed']) for s in students] == [
+            ('student-a1', 'Test User', 2, 2),
+        ]
+        assert request(base + '/api/classroom')[1]['clients'] == 1
+        conn.close()
+
+
+class TestZipExport:
+    """Test the streamed "Download all my files" ZIP"""
+
+    def test_zip_is_streamed_without_seeking(self):
+        """Test the archive is written to an append-only stream and has every lesson"""
+        class AppendOnly:
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, data):
+                self.chunks.append(bytes(data))
+                return len(data)
+
+            def flush(self):
+                pass
+
+        lesson_ids, translations = load_export_sources()
+        state = {'name': 'Test User', 'language': 'fr', 'codeByLesson': {'html-1': '<h1>Bonjour</h1>'}}
+        out = AppendOnly()
+        size, uncompressed = write_zip(lesson_files(state, lesson_ids, translations), out)
+
+        assert len(out.chunks) > len(lesson_ids)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(out.chunks)))
+        assert archive.namelist() == [f'{lesson_id}.html' for lesson_id in lesson_ids]
+        assert '<body>\n<h1>Bonjour</h1>\n</body>' in archive.read('html-1.html').decode('utf-8')
+        template = translations['fr']['lessons']['css-1']['codeTemplate'].strip()
+        assert template in archive.read('css-1.html').decode('utf-8')
+        assert size == sum(len(chunk) for chunk in out.chunks)
+        assert uncompressed == sum(info.file_size for info in archive.infolist())
+
+    def test_wrap_in_doc(self):
+        """Test fragments are wrapped and full documents kept as is"""
+        assert wrap_in_doc('<p>Hi</p>', 'html-1').startswith('<!DOCTYPE html>')
+        assert '<title>html-1</title>' in wrap_in_doc('<p>Hi</p>', 'html-1')
+        full = '<!doctype html><html><body></body></html>'
+        assert wrap_in_doc(full, 'html-1') == full
+
+    def test_export_endpoint(self, start_server, tmp_path):
+        """Test the form post used by the app and export from saved progress"""
+        base = start_server('--zip-export', '--progress-db', str(tmp_path / 'progress.db'))
+        assert request(base + '/api/export') == (200, {'enabled': True})
+
+        state = {'name': 'Test User', 'language': 'en', 'codeByLesson': {'css-2': '<p>mine</p>'}}
+        form = urllib.parse.urlencode({'state': json.dumps(state)}).encode('utf-8')
+        with urllib.request.urlopen(base + '/api/export', data=form, timeout=5) as response:
+            assert response.headers['Content-Type'] == 'application/zip'
+            assert 'html-css-accessibility-lessons-Test-User.zip' in response.headers['Content-Disposition']
+            archive = zipfile.ZipFile(io.BytesIO(response.read()))
+        assert len(archive.namelist()) == 20
+        assert '<p>mine</p>' in archive.read('css-2.html').decode('utf-8')
+
+        request(base + '/api/progress/student-a1', PROGRESS)
+        status, payload = request(base + '/api/export/student-a1')
+        archive = zipfile.ZipFile(io.BytesIO(payload))
+        assert '<p>Hello</p>' in archive.read('fundamentals-4.html').decode('utf-8')  # PROGRESS is on lesson index 3
+        assert request(base + '/api/export/unknown-student')[0] == 404
+        assert request(base + '/api/export', {'codeByLesson': []})[0] == 400
+
+
+class TestMetrics:
+    """Test the sharded metrics and the /metrics endpoint"""
+
+    def test_counters_from_many_threads(self):
+        """Test updates from many threads add up across shards"""
+        metrics = Metrics(shards=4)
+        labels = (('route', '/index.html'),)
+
+        def work():
+            for _ in range(1000):
+                metrics.inc('http_requests_total', labels)
+                metrics.observe('http_request_duration_seconds', labels, 0.003)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        text = metrics.render()
+        assert 'http_requests_total{route="/index.html"} 8000' in text
+        assert 'http_request_duration_seconds_bucket{route="/index.html",le="0.0025"} 0' in text
+        assert 'http_request_duration_seconds_bucket{route="/index.html",le="0.005"} 8000' in text
+        assert 'http_request_duration_seconds_bucket{route="/index.html",le="+Inf"} 8000' in text
+        assert 'http_request_duration_seconds_count{route="/index.html"} 8000' in text
+
+    def test_threads_spread_across_shards(self):
+        """Test concurrent threads record into different shards rather than all sharing one lock"""
+        metrics = Metrics(shards=4)
+        barrier = threading.Barrier(8)
+
+        def work():
+            barrier.wait()
+            metrics.inc('http_requests_total')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        used = [shard for shard in metrics._shards if shard.counters]
+        assert len(used) == 4
+        assert 'http_requests_total 8' in metrics.render()
+
+    def test_metrics_endpoint(self, start_server, tmp_path):
+        """Test requests are counted by route with ids collapsed"""
+        base = start_server('--metrics', '--short-links', str(tmp_path / 'links.db'))
+        request(base + '/styles.css')
+        request(base + '/s/unknown-one')
+        request(base + '/s/unknown-two')
+
+        status, body = request(base + '/metrics')
+        text = body.decode('utf-8')
+        assert status == 200
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_requests_total{route="/s/:id",method="GET",status="404"} 2' in text
+        assert 'http_requests_total{route="/styles.css",method="GET",status="200"} 1' in text
+        assert 'http_response_bytes_total{route="/styles.css"}' in text
+        assert 'http_active_connections 1' in text
+        assert 'shortlink_cache_misses_total 2' in text
+
+
+class TestClientTimings:
+    """Test startup timings reported by browsers"""
+
+    def test_percentiles(self):
+        """Test nearest-rank percentiles over the recent window"""
+        timings = ClientTimings(window=100)
+        for ms in range(1, 201):
+            timings.record({'script-start': float(ms)})
+        summary = timings.summary()['script-start']
+        assert summary['count'] == 200
+        assert (summary['p50'], summary['p95'], summary['p99']) == (150.0, 195.0, 199.0)
+        assert validate_timings({'marks': {'app-render': 120, 'unknown': 5}}) == {'app-render': 120.0}
+        for bad in ({}, {'marks': {'app-render': -1}}, {'marks': {'unknown': 5}}):
+            with pytest.raises(ValueError):
+                validate_timings(bad)
+
+    def test_timings_endpoint(self, start_server):
+        """Test beacons are aggregated and shown on /metrics as a summary"""
+        base = start_server('--metrics')
+        for ms in (100, 200, 300, 400):
+            assert request(base + '/api/timings', {'marks': {'script-start': ms, 'app-render': ms + 50}})[0] == 204
+        assert request(base + '/api/timings', {'marks': 'x'})[0] == 400
+
+        status, payload = request(base + '/api/timings')
+        assert payload['enabled'] and payload['marks']['script-start']['p50'] == 200.0
+        text = request(base + '/metrics')[1].decode('utf-8')
+        assert '# TYPE client_timing_milliseconds summary' in text
+        assert 'client_timing_milliseconds{mark="app-render",quantile="0.99"} 450.0' in text
+        assert 'client_timing_milliseconds_count{mark="script-start"} 4' in text
+
+
+class TestAccessLog:
+    """Test the background JSON-lines access log"""
+
+    def test_full_queue_drops_instead_of_blocking(self, tmp_path):
+        """Test records are dropped and counted while the writer is stuck"""
+        log = AccessLog(str(tmp_path / 'access.log'), queue_size=2)
+        gate = threading.Event()
+        write = log._write
+        log._write = lambda records: (gate.wait(), write(records))
+
+        log.log({'n': 0})
+        time.sleep(0.2)  # the writer picks up the first record and waits at the gate
+        start = time.perf_counter()
+        for i in range(1, 6):
+            log.log({'n': i})
+        assert time.perf_counter() - start < 0.1
+        assert log.stats['dropped'] == 3
+
+        gate.set()
+        log.close()
+        lines = (tmp_path / 'access.log').read_text().splitlines()
+        assert [json.loads(line)['n'] for line in lines] == [0, 1, 2]
+
+    def test_rotation(self, tmp_path):
+        """Test the log is rotated by size and old files are kept up to the backup count"""
+        path = tmp_path / 'access.log'
+        log = AccessLog(str(path), max_bytes=200, backups=2)
+        for i in range(30):
+            log.log({'path': '/index.html', 'n': i})
+            time.sleep(0.005)
+        log.close()
+        assert log.stats['rotations'] > 2
+        assert os.path.exists(f'{path}.2') and not os.path.exists(f'{path}.3')
+        assert json.loads(path.read_text().splitlines()[-1])['n'] == 29
+
+    def test_server_access_log(self, start_server, tmp_path):
+        """Test the server writes one JSON record per request"""
+        path = tmp_path / 'access.log'
+        base = start_server('--access-log', str(path))
+        request(base + '/styles.css')
+        for _ in range(50):
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+            if any(record.get('path') == '/styles.css' for record in records):
+                break
+            time.sleep(0.05)
+        record = next(record for record in records if record.get('path') == '/styles.css')
+        assert record['method'] == 'GET'
+        assert record['status'] == 200
+        assert record['bytes'] > os.path.getsize(os.path.join(PROJECT_DIR, 'styles.css'))
+        assert record['duration_ms'] >= 0
+
+
+class TestProfiler:
+    """Test sampled request profiling"""
+
+    def test_profiles_are_merged_per_route(self, tmp_path):
+        """Test sampled calls are merged per route and dumped as pstats files"""
+        profiler = RequestProfiler(1.0, str(tmp_path / 'profiles'))
+        for route in ('/index.html', '/index.html', '/api/progress/:id'):
+            profile = profiler.start()
+            sorted(range(10000), key=lambda x: -x)
+            profiler.finish(profile, route)
+
+        summary = profiler.summary(top=5)
+        assert '=== /index.html: 2 requests' in summary
+        assert '=== /api/progress/:id: 1 requests' in summary
+        files = profiler.dump()
+        assert sorted(os.path.basename(f).split('-', 2)[2] for f in files) == [
+            'api_progress_id.prof', 'index.html.prof', 'summary.txt']
+
+    def test_only_one_request_profiled_at_a_time(self, tmp_path):
+        """Test a sampled request is skipped while another is being profiled"""
+        profiler = RequestProfiler(1.0, str(tmp_path / 'profiles'))
+        first = profiler.start()
+        assert profiler.start() is None
+        assert profiler.skipped == 1
+        profiler.finish(first, '/')
+        assert profiler.start() is not None
+
+    def test_profile_endpoint(self, start_server, tmp_path):
+        """Test GET /api/profile returns the summary and writes the dumps"""
+        base = start_server('--profile', '1', '--profile-dir', str(tmp_path / 'profiles'))
+        # One request is profiled at a time, and the startup check's profile may still be finishing
+        for _ in range(3):
+            request(base + '/styles.css')
+        status, body = request(base + '/api/profile?top=5')
+        assert status == 200
+        assert '=== /styles.css:' in body.decode('utf-8')
+        assert any(name.endswith('styles.css.prof') for name in os.listdir(tmp_path / 'profiles'))
+
+    def test_event_streams_are_not_profiled(self, start_server, tmp_path):
+        """Test an open classroom event stream does not keep other requests from being profiled"""
+        base = start_server('--profile', '1', '--profile-dir', str(tmp_path / 'profiles'), '--classroom')
+        with urllib.request.urlopen(base + '/api/classroom/events', timeout=5) as stream:
+            stream.readline()
+            for _ in range(3):
+                request(base + '/styles.css')
+            status, body = request(base + '/api/profile?top=5')
+        summary = body.decode('utf-8')
+        assert '=== /styles.css:' in summary
+        assert '/api/classroom/events' not in summary
+
+
+class TestAsyncEngine:
+    """Test the asyncio engine (--engine asyncio)"""
+
+    def test_static_files_over_keep_alive(self, start_server):
+        """Test files are served with the usual headers on one reused connection"""
+        base = start_server('--engine', 'asyncio', '--metrics')
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        for path, name in (('/index.html', 'index.html'), ('/styles.css', 'styles.css'), ('/', 'index.html')):
+            conn.request('GET', path)
+            response = conn.getresponse()
+            with open(os.path.join(PROJECT_DIR, name), 'rb') as f:
+                assert response.read() == f.read()
+            assert response.status == 200
+            assert response.getheader('Connection') == 'keep-alive'
+            assert response.getheader('Access-Control-Allow-Origin') == '*'
+            assert response.getheader('Cache-Control') == 'no-store, no-cache, must-revalidate'
+        conn.close()
+
+        text = request(base + '/metrics')[1].decode('utf-8')
+        assert 'async_keepalive_reuses_total 2' in text
+        assert 'http_requests_total{route="/styles.css",method="GET",status="200"} 1' in text
+
+    def test_other_requests_use_the_handler(self, start_server, tmp_path):
+        """Test API routes, redirects and errors behave as on the threaded engine"""
+        base = start_server('--engine', 'asyncio', '--progress-db', str(tmp_path / 'progress.db'))
+        assert request(base + '/api/progress/student-a1', PROGRESS) == (202, {'saved': True})
+        assert request(base + '/api/progress/student-a1') == (200, PROGRESS)
+        assert request(base + '/missing.html')[0] == 404
+
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('HEAD', '/index.html')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert int(response.getheader('Content-Length')) == os.path.getsize(os.path.join(PROJECT_DIR, 'index.html'))
+        assert response.read() == b''
+        conn.close()
+
+
+class TestKeepAlive:
+    """Test HTTP/1.1 persistent connections on the threaded engine"""
+
+    def test_requests_share_a_connection_up_to_the_limit(self, start_server):
+        """Test files and API responses reuse one connection until the request limit closes it"""
+        base = start_server('--metrics', '--max-requests-per-connection', '3')
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', '/index.html')
+        response = conn.getresponse()
+        response.read()
+        sock = conn.sock
+        assert response.version == 11
+        assert response.getheader('Keep-Alive') == 'timeout=15, max=2'
+
+        conn.request('GET', '/api/timings')
+        response = conn.getresponse()
+        assert json.loads(response.read())['enabled'] is True
+        assert conn.sock is sock
+
+        conn.request('GET', '/styles.css')
+        response = conn.getresponse()
+        with open(os.path.join(PROJECT_DIR, 'styles.css'), 'rb') as f:
+            assert response.read() == f.read()
+        assert response.getheader('Connection') == 'close'
+        assert conn.sock is None
+        conn.close()
+
+        text = request(base + '/metrics')[1].decode('utf-8')
+        assert 'http_keepalive_reuses_total 2' in text
+        # The startup check made one request on its own connection
+        assert 'http_requests_per_connection_bucket{le="2"} 1' in text
+        assert 'http_requests_per_connection_bucket{le="5"} 2' in text
+
+    def test_idle_connections_are_closed(self, start_server):
+        """Test a connection with no new request is closed after the idle timeout"""
+        base = start_server('--keepalive-timeout', '0.5')
+        host, port = base.split('//')[1].split(':')
+        with socket.create_connection((host, int(port)), timeout=5) as sock:
+            sock.sendall(b'GET /styles.css HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            size = os.path.getsize(os.path.join(PROJECT_DIR, 'styles.css'))
+            data = b''
+            while b'\r\n\r\n' not in data or len(data.split(b'\r\n\r\n', 1)[1]) < size:
+                data += sock.recv(65536)
+            start = time.monotonic()
+            assert sock.recv(1) == b''
+            assert 0.3 < time.monotonic() - start < 4
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='needs fork() and SO_REUSEPORT')
+class TestWorkers:
+    """Test worker processes (--workers)"""
+
+    def test_crashed_worker_is_restarted(self):
+        """Test the supervisor restarts a killed worker and stops the rest cleanly"""
+        code = ('import os, time\n'
+                'from supervisor import Supervisor\n'
+                'index = Supervisor(2, restart_delay=0.1).run()\n'
+                'os.write(1, f"{index} {os.getpid()}\\n".encode())\n'  # one write: both workers share the pipe
+                'time.sleep(30)\n')
+        proc = subprocess.Popen([sys.executable, '-c', code], cwd=PROJECT_DIR, stdout=subprocess.PIPE, text=True)
+        try:
+            assert proc.stdout.readline().startswith('👷 Starting 2 workers')
+            workers = dict(proc.stdout.readline().split() for _ in range(2))
+            assert set(workers) == {'0', '1'}
+            os.kill(int(workers['1']), 9)
+            assert 'Worker 1' in proc.stdout.readline()
+            index, pid = proc.stdout.readline().split()
+            assert index == '1' and pid != workers['1']
+        finally:
+            proc.terminate()
+            assert proc.wait(timeout=5) == 0
+
+    def test_workers_share_the_port(self, start_server, tmp_path):
+        """Test every worker serves on the same port, each with its own access log"""
+        base = start_server('--workers', '2', '--access-log', str(tmp_path / 'access.log'))
+        for _ in range(20):
+            assert request(base + '/styles.css')[0] == 200
+        assert sorted(os.listdir(tmp_path)) == ['access-worker0.log', 'access-worker1.log']
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR2'), reason='needs SIGUSR2')
+class TestGracefulReload:
+    """Test reloading with kill -USR2"""
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_reload_finishes_in_flight_requests(self, engine):
+        """Test the new server takes over the socket while the old one finishes its request and exits"""
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'server.py'), str(port), '--engine', engine],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                env=dict(os.environ, PYTHONUNBUFFERED='1'), start_new_session=True)
+        base = f'http://127.0.0.1:{port}'
+        errors = []
+        stop = threading.Event()
+
+        def load():
+            while not stop.is_set():
+                try:
+                    request(base + '/styles.css')
+                except OSError as e:
+                    errors.append(e)
+
+        try:
+            while 'kill -USR2' not in proc.stdout.readline():
+                pass
+            # A request whose headers have not finished arriving when the reload starts
+            in_flight = socket.create_connection(('127.0.0.1', port), timeout=5)
+            in_flight.sendall(b'GET /styles.css HTTP/1.1\r\nHost: localhost\r\n')
+            time.sleep(0.2)
+            loader = threading.Thread(target=load)
+            loader.start()
+            os.kill(proc.pid, signal.SIGUSR2)
+            while 'New server running' not in proc.stdout.readline():
+                pass
+
+            in_flight.sendall(b'\r\n')
+            response = in_flight.makefile('rb').read()
+            in_flight.close()
+            assert response.startswith(b'HTTP/1.1 200 OK')
+            assert b'Connection: close' in response
+            assert proc.wait(timeout=10) == 0
+            stop.set()
+            loader.join()
+            assert errors == []
+            assert request(base + '/index.html')[0] == 200
+        finally:
+            stop.set()
+            os.killpg(proc.pid, signal.SIGTERM)
+
+    def test_reload_serves_complete_pages(self):
+        """Test the page is always sent whole while the new server rebuilds the site during a reload"""
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'server.py'), str(port), '--fingerprint'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                env=dict(os.environ, PYTHONUNBUFFERED='1'), start_new_session=True)
+        base = f'http://127.0.0.1:{port}'
+        bodies = []
+        errors = []
+        stop = threading.Event()
+
+        def load():
+            while not stop.is_set():
+                try:
+                    bodies.append(request(base + '/'))
+                except OSError as e:
+                    errors.append(e)
+
+        try:
+            while 'kill -USR2' not in proc.stdout.readline():
+                pass
+            loader = threading.Thread(target=load)
+            loader.start()
+            os.kill(proc.pid, signal.SIGUSR2)
+            assert proc.wait(timeout=10) == 0
+            time.sleep(0.2)
+            stop.set()
+            loader.join()
+            assert errors == []
+            assert len(bodies) > 10
+            assert all(status == 200 and body.rstrip().endswith(b'</html>') for status, body in bodies)
+        finally:
+            stop.set()
+            os.killpg(proc.pid, signal.SIGTERM)
+
+
+class TestAdmission:
+    """Test the connection limit, accept queue and timeouts"""
+
+    def test_queue_then_shed(self):
+        """Test connections beyond the limit queue in order, then get shed"""
+        admission = AdmissionQueue(max_active=1, max_queued=2)
+        assert [admission.admit(n) for n in range(4)] == ['run', 'queued', 'queued', 'shed']
+        assert admission.depth == 2
+        assert admission.release() == 1
+        assert admission.release() == 2
+        assert admission.release() is None
+        assert admission.active == 0
+        assert admission.stats == {'admitted': 3, 'queued': 2, 'shed': 1, 'peak_depth': 2}
+
+    def test_stalled_clients_time_out_and_busy_server_sheds(self, start_server):
+        """Test stalled requests are closed after --read-timeout, freeing slots for queued connections"""
+        base = start_server('--max-connections', '2', '--accept-queue', '1', '--read-timeout', '1', '--metrics')
+        host, port = base.split('//')[1].split(':')
+        stalled = [socket.create_connection((host, int(port)), timeout=5) for _ in range(2)]
+        for sock in stalled:
+            sock.sendall(b'GET /index.html HTTP/1.1\r\n')  # headers never finish
+        time.sleep(0.2)
+        queued = socket.create_connection((host, int(port)), timeout=5)
+        queued.sendall(b'GET /styles.css HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+        time.sleep(0.2)
+
+        shed = socket.create_connection((host, int(port)), timeout=5)
+        shed.sendall(b'GET /styles.css HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = shed.makefile('rb').read()
+        assert response.startswith(b'HTTP/1.1 503 Service Unavailable')
+        assert b'Retry-After: 5' in response
+
+        start = time.monotonic()
+        assert queued.makefile('rb').read().startswith(b'HTTP/1.1 200 OK')
+        assert 0.5 < time.monotonic() - start < 3
+        for sock in stalled:
+            assert sock.recv(1024) == b''
+            sock.close()
+        queued.close()
+        shed.close()
+
+        text = request(base + '/metrics')[1].decode('utf-8')
+        assert 'http_admission_queued_total 1' in text
+        assert 'http_admission_shed_total 1' in text
+
+
+class TestPreload:
+    """Test Link: rel=preload headers and 103 Early Hints for index.html"""
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_index_lists_preloads_from_manifest(self, start_server, engine):
+        """Test the page's Link header matches the manifest's preload list, and other files get none"""
+        base = start_server('--engine', engine)
+        with open(os.path.join(PROJECT_DIR, 'precache-manifest.json')) as f:
+            preload = json.load(f)['preload']
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        response.read()
+        links = response.getheader('Link').split(', ')
+        assert len(links) == len(preload)
+        assert '</styles.css>; rel=preload; as=style' in links
+        assert '</translations.json>; rel=preload; as=fetch; crossorigin' in links
+        assert any(link.startswith('<https://unpkg.com/react@18/') for link in links)
+        conn.request('GET', '/styles.css')
+        response = conn.getresponse()
+        response.read()
+        assert response.getheader('Link') is None
+        conn.close()
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_early_hints_before_index(self, start_server, engine):
+        """Test --early-hints sends a 103 with the Link header ahead of the 200"""
+        base = start_server('--engine', engine, '--early-hints')
+        host, port = base.split('//')[1].split(':')
+        with socket.create_connection((host, int(port)), timeout=5) as sock:
+            sock.sendall(b'GET /index.html HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+            response = sock.makefile('rb').read()
+        hints, final = response.split(b'\r\n\r\n', 1)
+        assert hints.startswith(b'HTTP/1.1 103 Early Hints\r\nLink: </styles.css>; rel=preload; as=style')
+        assert final.startswith(b'HTTP/1.1 200 OK')
+
+        # HTTP/1.0 clients may not understand interim responses
+        with socket.create_connection((host, int(port)), timeout=5) as sock:
+            sock.sendall(b'GET / HTTP/1.0\r\n\r\n')
+            assert sock.makefile('rb').read().startswith(b'HTTP/1.1 200 OK')
+
+
+class TestFingerprint:
+    """Test serving fingerprinted assets (--fingerprint)"""
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_page_refers_to_immutable_assets(self, start_server, engine):
+        """Test index.html points at hashed copies served with long-term caching, and the page itself is not cached"""
+        base = start_server('--engine', engine, '--fingerprint')
+        with open(os.path.join(PROJECT_DIR, 'asset-manifest.json')) as f:
+            assets = json.load(f)
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        page = response.read().decode('utf-8')
+        assert response.getheader('Cache-Control') == 'no-store, no-cache, must-revalidate'
+        assert f'href="{assets["styles.css"]}"' in page
+        assert f'<{"/" + assets["styles.css"]}>; rel=preload; as=style' in response.getheader('Link')
+
+        conn.request('GET', '/' + assets['translations.json'])
+        response = conn.getresponse()
+        with open(os.path.join(PROJECT_DIR, 'translations.json'), 'rb') as f:
+            assert response.read() == f.read()
+        assert response.getheader('Cache-Control') == 'public, max-age=31536000, immutable'
+
+        conn.request('GET', '/assets/styles.0123456789abcdef.css')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 404
+        assert response.getheader('Cache-Control') == 'no-store, no-cache, must-revalidate'
+        conn.close()
+
+
+class TestWsgiApp:
+    """Test the site as a WSGI application (app.py), called in-process"""
+
+    @pytest.fixture
+    def call(self, tmp_path):
+        """Call the app under wsgiref's validator; returns (status, headers, body)"""
+        app = create_app(AppConfig(progress_db=str(tmp_path / 'progress.db'), metrics=True))
+        checked = wsgiref.validate.validator(app)
+
+        def call(method, path, data=None, headers=None):
+            environ = {'REQUEST_METHOD': method, 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': '',
+                       **(headers or {})}
+            if data is not None:
+                body = json.dumps(data).encode('utf-8')
+                environ.update({'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                                'wsgi.input': io.BytesIO(body)})
+            wsgiref.util.setup_testing_defaults(environ)
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'], started['headers'] = status, dict(headers)
+            result = checked(environ, start_response)
+            try:
+                body = b''.join(result)
+            finally:
+                result.close()
+            return int(started['status'].split()[0]), started['headers'], body
+
+        yield call
+        app.close()
+
+    def test_serves_the_page_with_headers(self, call):
+        """Test index.html is served with the CORS, no-cache and preload headers, and ranges of it"""
+        status, headers, body = call('GET', '/')
+        assert status == 200
+        assert b'<html' in body
+        assert headers['Cache-Control'] == 'no-store, no-cache, must-revalidate'
+        assert headers['Access-Control-Allow-Origin'] == '*'
+        assert '</styles.css>; rel=preload; as=style' in headers['Link']
+        assert call('GET', '/missing.css')[0] == 404
+        status, headers, partial = call('GET', '/index.html', headers={'HTTP_RANGE': 'bytes=0-5'})
+        assert (status, headers['Content-Range'], partial) == (206, f'bytes 0-5/{len(body)}', body[:6])
+        assert call('DELETE', '/')[0] == 501
+
+    def test_progress_api_and_metrics(self, call):
+        """Test the progress API and /metrics work through the WSGI interface"""
+        assert call('POST', '/api/progress/student-a1', PROGRESS)[0] == 202
+        status, _, body = call('GET', '/api/progress/student-a1')
+        assert (status, json.loads(body)) == (200, PROGRESS)
+        _, headers, body = call('GET', '/metrics')
+        assert headers['Content-Type'].startswith('text/plain')
+        assert 'route="/api/progress/:id"' in body.decode('utf-8')
+
+    def test_importing_server_has_no_side_effects(self, tmp_path):
+        """Test importing server.py neither parses the command line nor changes directory"""
+        result = subprocess.run([sys.executable, '-c', 'import os, server; print(os.getcwd())', '--not-an-option'],
+                                cwd=tmp_path, env={**os.environ, 'PYTHONPATH': PROJECT_DIR},
+                                capture_output=True, text=True, timeout=30)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == str(tmp_path)
+
+    def test_config_from_environment(self):
+        """Test AppConfig reads APP_* variables, converting them to the field types"""
+        config = AppConfig.from_env({'APP_PROGRESS_DB': 'p.db', 'APP_METRICS': '1', 'APP_CLASSROOM': 'no',
+                                     'APP_PROFILE': '0.5', 'OTHER': 'x'})
+        assert config == AppConfig(progress_db='p.db', metrics=True, profile=0.5)
+
+
+class TestRanges:
+    """Test range requests for static files (206 Partial Content)"""
+
+    def test_parse_range(self):
+        """Test Range headers are parsed, clamped and merged like RFC 9110 describes"""
+        assert parse_range('bytes=0-99', 1000) == [(0, 100)]
+        assert parse_range('bytes=900-', 1000) == [(900, 1000)]
+        assert parse_range('bytes=-100', 1000) == [(900, 1000)]
+        assert parse_range('bytes=990-2000', 1000) == [(990, 1000)]
+        assert parse_range('bytes=50-99, 0-9, 60-120', 1000) == [(0, 10), (50, 121)]
+        assert parse_range('bytes=1000-', 1000) == []
+        for ignored in ('items=0-1', 'bytes=5-1', 'bytes=a-b', 'bytes=' + ','.join(['0-0'] * 17)):
+            assert parse_range(ignored, 1000) is None
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_partial_content(self, start_server, engine):
+        """Test single and multiple ranges, If-Range and unsatisfiable ranges on both engines"""
+        base = start_server('--engine', engine)
+        with open(os.path.join(PROJECT_DIR, 'styles.css'), 'rb') as f:
+            content = f.read()
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+
+        def get(headers):
+            conn.request('GET', '/styles.css', headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+
+        response, body = get({})
+        assert (response.status, body) == (200, content)
+        assert response.getheader('Accept-Ranges') == 'bytes'
+        etag, last_modified = response.getheader('ETag'), response.getheader('Last-Modified')
+
+        response, body = get({'Range': 'bytes=10-19', 'If-Range': etag})
+        assert (response.status, body) == (206, content[10:20])
+        assert response.getheader('Content-Range') == f'bytes 10-19/{len(content)}'
+        response, body = get({'Range': 'bytes=-5', 'If-Range': last_modified})
+        assert (response.status, body) == (206, content[-5:])
+
+        response, body = get({'Range': 'bytes=0-3,100-103'})
+        assert response.status == 206
+        message = email.message_from_bytes(b'Content-Type: ' + response.getheader('Content-Type').encode() +
+                                           b'\r\n\r\n' + body, policy=email.policy.HTTP)
+        parts = list(message.iter_parts())
+        assert [part.get_content() for part in parts] == [content[0:4].decode(), content[100:104].decode()]
+        assert parts[1]['Content-Range'] == f'bytes 100-103/{len(content)}'
+
+        response, body = get({'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        assert (response.status, body) == (200, content)
+        response, body = get({'Range': f'bytes={len(content)}-'})
+        assert response.status == 416
+        assert response.getheader('Content-Range') == f'bytes */{len(content)}'
+        conn.close()
+
+    @pytest.mark.parametrize('engine', ['threaded', 'asyncio'])
+    def test_head_and_not_modified(self, start_server, engine):
+        """Test HEAD and If-None-Match get the same file headers as a GET on both engines"""
+        base = start_server('--engine', engine)
+        conn = http.client.HTTPConnection(base.split('//')[1], timeout=5)
+        conn.request('GET', '/styles.css')
+        response = conn.getresponse()
+        body = response.read()
+        etag = response.getheader('ETag')
+        conn.request('HEAD', '/styles.css')
+        response = conn.getresponse()
+        assert (response.status, response.read()) == (200, b'')
+        assert (response.getheader('ETag'), response.getheader('Content-Length')) == (etag, str(len(body)))
+        conn.request('GET', '/styles.css', headers={'If-None-Match': etag})
+        response = conn.getresponse()
+        assert (response.status, response.read(), response.getheader('ETag')) == (304, b'', etag)
+        conn.request('GET', '/missing.css')
+        response = conn.getresponse()
+        assert response.status == 404
+        response.read()
+        conn.close()
+
+
+class TestLiveReload:
+    """Test dev mode (--dev): file watching, incremental rebuilds and the reload event stream"""
+
+    def test_watcher_reports_settled_changes(self, tmp_path):
+        """Test the watcher calls back once per change with the changed files"""
+        watched = [tmp_path / 'a.css', tmp_path / 'b.json']
+        for path in watched:
+            path.write_text('x')
+        changes = []
+        watcher = FileWatcher([str(path) for path in watched], changes.append, interval=0.05)
+        try:
+            watched[1].write_text('changed')
+            deadline = time.monotonic() + 5
+            while not changes and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            watcher.close()
+        assert changes == [[str(watched[1])]]
+
+    def test_edit_rebuilds_and_notifies_pages(self, tmp_path):
+        """Test editing translations.json rebuilds the table and pushes a new version to open pages"""
+        for name in ('index.html', 'styles.css', 'translations.json', 'lesson-validators.json'):
+            with open(os.path.join(PROJECT_DIR, name), 'rb') as f:
+                (tmp_path / name).write_bytes(f.read())
+        app = create_app(AppConfig(directory=str(tmp_path), dev=True))
+
+        def environ(path, **headers):
+            environ = {'PATH_INFO': path, **headers}
+            wsgiref.util.setup_testing_defaults(environ)
+            return environ
+        try:
+            status, headers, body = app.handle(environ('/'))
+            assert b"new EventSource('/api/dev/events')" in b''.join(body)
+            etag = dict(headers)['ETag']
+            assert app.handle(environ('/index.html', HTTP_IF_NONE_MATCH=etag))[0] == 304
+            assert ('Cache-Control', 'no-cache') in app.response_headers('/styles.css', 200)
+
+            status, headers, events = app.handle(environ('/api/dev/events'))
+            first = next(events).decode('utf-8')
+            translations = json.loads((tmp_path / 'translations.json').read_text())
+            translations['en']['ui']['title'] = 'Edited title'
+            (tmp_path / 'translations.json').write_text(json.dumps(translations))
+            second = next(events).decode('utf-8')
+            events.close()
+            assert first.split('data: ')[1] != second.split('data: ')[1]
+            table = json.loads((tmp_path / 'translation-table.json').read_text())
+            assert table['en']['ui.title'] == 'Edited title'
+            assert 'Edited title' in (tmp_path / 'index-standalone.html').read_text()
+        finally:
+            app.close()
+
+    def test_edit_updates_early_hints(self, tmp_path):
+        """Test a stylesheet added to index.html is preloaded after the rebuild, without changing directory"""
+        for name in ('index.html', 'styles.css', 'translations.json', 'lesson-validators.json'):
+            with open(os.path.join(PROJECT_DIR, name), 'rb') as f:
+                (tmp_path / name).write_bytes(f.read())
+        cwd = os.getcwd()
+        app = create_app(AppConfig(directory=str(tmp_path), dev=True))
+        try:
+            assert '</extra.css>' not in app.early_hints('/index.html')
+            page = (tmp_path / 'index.html').read_text()
+            (tmp_path / 'index.html').write_text(
+                page.replace('</head>', '<link rel="stylesheet" href="extra.css">\n</head>', 1))
+            deadline = time.monotonic() + 10
+            while '</extra.css>' not in app.early_hints('/index.html') and time.monotonic() < deadline:
+                assert os.getcwd() == cwd
+                time.sleep(0.05)
+            assert '</extra.css>; rel=preload; as=style' in app.early_hints('/index.html')
+            assert app.early_hints('/styles.css') is None
+        finally:
+            app.close()
+        assert os.getcwd() == cwd
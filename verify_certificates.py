@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Verify certificate URLs submitted by students.
+
+Each URL's hash is decoded the same way the app does it (see
+state_codec.py), and the certificate is valid when it has a name and its
+completed lessons cover every lesson in the course.
+
+Usage:
+    python3 verify_certificates.py URLS_FILE [-o report.csv] [--short-links PATH]
+    python3 verify_certificates.py - < urls.txt
+
+URLS_FILE has one URL per line: a full certificate URL, just its hash, or a
+/s/<id> short link (resolved with --short-links, the database used by
+server.py --short-links).
+
+Output:
+    A CSV report (stdout by default) with one row per URL:
+        url, valid, name, language, completed, missing, error
+    'missing' lists the ids of the lessons that are not completed
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from state_codec import decode_state, hash_from_url, short_link_id
+
+VALIDATORS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lesson-validators.json')
+
+REPORT_FIELDS = ['url', 'valid', 'name', 'language', 'completed', 'missing', 'error']
+
+
+def load_lesson_ids(path=VALIDATORS_PATH):
+    """Lesson ids in course order (completedLessons holds indexes into this list)."""
+    with open(path, 'r') as f:
+        return list(json.load(f)['lessons'])
+
+
+def verify_url(url, lesson_ids, short_links=None):
+    """Report row (dict with REPORT_FIELDS) for one certificate URL."""
+    row = {'url': url, 'valid': False, 'name': '', 'language': '', 'completed': 0, 'missing': '', 'error': ''}
+    hash_value = hash_from_url(url)
+    short_id = short_link_id(url)
+    if short_id is not None:
+        hash_value = short_links.resolve(short_id) if short_links is not None else None
+        if hash_value is None:
+            row['error'] = 'unknown short link' if short_links is not None else 'short link (use --short-links)'
+            return row
+
+    state = decode_state(hash_value) if hash_value else None
+    if not isinstance(state, dict):
+        row['error'] = 'could not decode'
+        return row
+
+    name = state.get('name')
+    completed = state.get('completedLessons')
+    row['name'] = name if isinstance(name, str) else ''
+    row['language'] = state.get('language') if isinstance(state.get('language'), str) else ''
+    if not isinstance(completed, list):
+        completed = []
+    done = {i for i in completed if isinstance(i, int) and not isinstance(i, bool) and 0 <= i < len(lesson_ids)}
+    missing = [lesson_id for i, lesson_id in enumerate(lesson_ids) if i not in done]
+    row['completed'] = len(done)
+    row['missing'] = ' '.join(missing)
+
+    if not row['name'].strip():
+        row['error'] = 'no name'
+    elif missing:
+        row['error'] = f'{len(missing)} lessons not completed'
+    else:
+        row['valid'] = True
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verify certificate URLs and write a CSV report.')
+    parser.add_argument('urls', help="file with one URL per line, or '-' for stdin")
+    parser.add_argument('-o', '--output', help='CSV report path (default: stdout)')
+    parser.add_argument('--short-links', metavar='PATH', help='short link database for resolving /s/<id> URLs')
+    parser.add_argument('--validators', default=VALIDATORS_PATH, help='path to lesson-validators.json')
+    args = parser.parse_args(argv)
+
+    lesson_ids = load_lesson_ids(args.validators)
+    short_links = None
+    if args.short_links:
+        from shortlinks import ShortLinkStore
+        short_links = ShortLinkStore(args.short_links)
+
+    source = sys.stdin if args.urls == '-' else open(args.urls, 'r')
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = csv.DictWriter(output, fieldnames=REPORT_FIELDS)
+    writer.writeheader()
+
+    total = valid = 0
+    start = time.perf_counter()
+    try:
+        for line in source:
+            url = line.strip()
+            if not url:
+                continue
+            row = verify_url(url, lesson_ids, short_links)
+            writer.writerow(row)
+            total += 1
+            valid += row['valid']
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+        if short_links is not None:
+            short_links.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0
+    print("=" * 80, file=sys.stderr)
+    print(f"✅ Valid certificates: {valid:,} / {total:,}", file=sys.stderr)
+    print(f"📊 Checked {total:,} URLs in {elapsed:.2f}s ({rate:,.0f}/s)", file=sys.stderr)
+    if args.output:
+        print(f"📄 Report written to: {args.output}", file=sys.stderr)
+    print("=" * 80, file=sys.stderr)
+    return 0 if total else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())